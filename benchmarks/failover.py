@@ -0,0 +1,99 @@
+"""
+Measure the failover time of the ring vote and the bully election.
+
+For every cluster size a local cluster is started on free ports and the master service is stopped.
+All remaining hosts are told at once that the master died, as if their heartbeats detected it in the same round,
+and the time until all of them agree on the new master is measured.
+The detection of the failure itself is left out, it takes the same time with both elections.
+
+Usage:
+    python3 -m benchmarks.failover [--sizes 3,5,10,20] [--runs 5]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import socket
+import statistics
+import threading
+import time
+from netzwerkprogrammierung.host import Host
+from netzwerkprogrammierung.service import Server
+
+
+class BenchmarkHost(Host):
+    # Override __execute_script method of Host to not execute scripts during the benchmark
+    def _Host__execute_script(self):
+        pass
+
+
+def free_port():
+    """
+    Find a free TCP port on localhost.
+    """
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def failover(size, election):
+    """
+    Start a cluster, stop its master and measure the time until the cluster converged on a new master.
+
+    Args:
+        size: number of hosts in the cluster
+        election: "ring" or "bully"
+
+    Returns:
+        seconds from the detection of the failure until all remaining hosts agree on the new master
+    """
+    hosts, servers, threads = [], [], []
+    for _ in range(size):
+        host = BenchmarkHost("localhost", free_port(), list(hosts), "masterscript.sh", "slavescript.sh",
+                             heartbeat_timeout=0.5, election=election)
+        server = Server(host)
+        thread = threading.Thread(target=server.accept_connections)
+        thread.start()
+        host.start()
+        hosts.append(host)
+        servers.append(server)
+        threads.append(thread)
+    master = hosts[0]
+    survivors = hosts[1:]
+    expected = max(host.key for host in survivors)
+    servers[0].stop_server()
+    threads[0].join()
+    start = time.monotonic()
+    for host in survivors:
+        if host._peer_died(host.peers.get(master.key)):
+            threading.Thread(target=host.start_vote).start()
+    while not all(host.master is not None and host.master.key == expected for host in survivors):
+        time.sleep(0.001)
+    elapsed = time.monotonic() - start
+    for server, thread in zip(servers[1:], threads[1:]):
+        server.stop_server()
+        thread.join()
+    for host in hosts:
+        host.connections.close()
+        host.executor.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the failover time of ring and bully elections.")
+    parser.add_argument("--sizes", default="3,5,10,20", help="Comma-seperated cluster sizes. Default: 3,5,10,20")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per cluster size and election. Default: 5")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    print("{:>5} {:>8} {:>10} {:>10}".format("size", "election", "median [s]", "max [s]"))
+    for size in (int(size) for size in args.sizes.split(",")):
+        for election in ("ring", "bully"):
+            # the http.server logs of the stopped connections are written to stderr
+            with contextlib.redirect_stderr(io.StringIO()):
+                times = [failover(size, election) for _ in range(args.runs)]
+            print("{:>5} {:>8} {:>10.3f} {:>10.3f}".format(size, election, statistics.median(times), max(times)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,575 @@
+"""
+This module includes the asyncio runtime of the service.
+
+All HTTP endpoints, heartbeat rounds, votes and master announcements run as tasks on a single
+asyncio event loop instead of a server thread, a polling thread and a thread per vote.
+The endpoints are the ones defined in the service module, so both runtimes answer requests identically.
+"""
+
+import asyncio
+import json
+import logging
+from http import HTTPStatus
+from netzwerkprogrammierung.errors import JoiningClusterError
+from netzwerkprogrammierung.heartbeat import UDPHeartbeatResponder
+from netzwerkprogrammierung.host import Host
+from netzwerkprogrammierung.membership import Membership
+from netzwerkprogrammierung.service import Request, dispatch
+
+
+class AsyncResponse:
+    """
+    Response to a request sent by the AsyncConnectionPool.
+
+    Attributes:
+        status_code: int, HTTP status code
+        headers: {str: str}, Response headers with lower case names
+        content: bytes, content of the response
+    """
+
+    def __init__(self, status_code, headers, content):
+        """
+        Init the response.
+
+        Args:
+            status_code: HTTP status code
+            headers: Response headers with lower case names
+            content: content of the response
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        """
+        Content of the response decoded as str.
+        """
+        return self.content.decode('utf-8')
+
+
+async def read_http_message(reader):
+    """
+    Read the start line, headers and body of a HTTP/1.1 message.
+
+    Args:
+        reader: asyncio.StreamReader of the connection
+
+    Returns:
+        (start line, headers, body) tuple, header names are lower case.
+        None if the connection was closed before a message started.
+
+    Raises:
+        ConnectionError: The message is malformed or the connection was closed while reading it.
+    """
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed while reading headers.")
+        if line in (b"\r\n", b"\n"):
+            break
+        name, separator, value = line.decode('latin-1').partition(":")
+        if not separator:
+            raise ConnectionError("Malformed header.")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+    except (ValueError, asyncio.IncompleteReadError):
+        raise ConnectionError("Could not read message body.")
+    return start_line.decode('latin-1').strip(), headers, body
+
+
+class AsyncConnectionPool:
+    """
+    Pool of persistent HTTP/1.1 connections to the peer services, built on asyncio streams.
+
+    Idle keep-alive connections are kept per peer and reused for the next request.
+    After a failed request the connection is closed, a stale idle connection is replaced once.
+
+    Attributes:
+        idle: {int: [(asyncio.StreamReader, asyncio.StreamWriter)]}, Idle connections by peer key.
+    """
+
+    def __init__(self):
+        """
+        Init the connection pool.
+        """
+        self.idle = {}
+        self.__counters = {"requests": 0, "failures": 0, "connections_created": 0, "connections_closed": 0}
+
+    async def get(self, peer, path, timeout=None):
+        """
+        Send a GET request to a peer.
+
+        Args:
+            peer: Peer the request is sent to.
+            path: Path of the request, e.g. /heartbeat
+            timeout: Timeout in seconds, None to wait forever.
+
+        Returns:
+            AsyncResponse of the peer.
+
+        Raises:
+            OSError, asyncio.TimeoutError: The request failed.
+        """
+        return await self.request("GET", peer, path, timeout=timeout)
+
+    async def post(self, peer, path, payload=None, timeout=None):
+        """
+        Send a POST request with a json payload to a peer.
+
+        Args:
+            peer: Peer the request is sent to.
+            path: Path of the request, e.g. /vote
+            payload: Object that is sent json encoded.
+            timeout: Timeout in seconds, None to wait forever.
+
+        Returns:
+            AsyncResponse of the peer.
+
+        Raises:
+            OSError, asyncio.TimeoutError: The request failed.
+        """
+        return await self.request("POST", peer, path, json.dumps(payload).encode('utf-8'), timeout)
+
+    async def request(self, method, peer, path, body=b"", timeout=None):
+        """
+        Send a request to a peer, reusing an idle connection if there is one.
+
+        Args:
+            method: HTTP method
+            peer: Peer the request is sent to.
+            path: Path of the request.
+            body: content of the request
+            timeout: Timeout in seconds, None to wait forever.
+
+        Returns:
+            AsyncResponse of the peer.
+
+        Raises:
+            OSError, asyncio.TimeoutError: The request failed.
+        """
+        try:
+            r = await asyncio.wait_for(self.__exchange(method, peer, path, body), timeout)
+        except (OSError, asyncio.TimeoutError):
+            self.__counters["failures"] += 1
+            raise
+        self.__counters["requests"] += 1
+        return r
+
+    def reset(self, peer):
+        """
+        Close the idle connections of a peer, e.g. after it left the cluster.
+
+        Args:
+            peer: Peer whose connections are closed.
+        """
+        for reader, writer in self.idle.pop(peer.key, []):
+            self.__close(writer)
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        for connections in self.idle.values():
+            for reader, writer in connections:
+                self.__close(writer)
+        self.idle = {}
+
+    def stats(self):
+        """
+        Get statistics of the pool.
+
+        Returns:
+            dict with the number of idle connections, sent requests, failed requests,
+            created and closed connections.
+        """
+        stats = dict(self.__counters)
+        stats["idle_connections"] = sum(len(c) for c in self.idle.values())
+        return stats
+
+    async def __exchange(self, method, peer, path, body):
+        """
+        Write the request and read the response on a pooled connection.
+
+        If a reused GET connection turns out to be closed by the peer in the meantime, the request
+        is sent again on a new connection. Other requests are not repeated, as the peer might
+        already have handled them.
+        """
+        idle = self.idle.get(peer.key)
+        if idle:
+            reader, writer = idle.pop()
+            try:
+                return await self.__send(reader, writer, method, peer, path, body)
+            except ConnectionError:
+                if method != "GET":
+                    raise
+        reader, writer = await asyncio.open_connection(peer.host, peer.port)
+        self.__counters["connections_created"] += 1
+        return await self.__send(reader, writer, method, peer, path, body)
+
+    async def __send(self, reader, writer, method, peer, path, body):
+        """
+        Send a request on a connection and read the response.
+
+        The connection is put back to the idle connections if it can be kept alive, closed otherwise.
+        """
+        try:
+            head = "{} {} HTTP/1.1\r\nHost: {}:{}\r\nContent-Length: {}\r\n".format(
+                method, path, peer.host, peer.port, len(body))
+            if body:
+                head += "Content-Type: application/json\r\n"
+            writer.write(head.encode('latin-1') + b"\r\n" + body)
+            await writer.drain()
+            message = await read_http_message(reader)
+            if message is None:
+                raise ConnectionError("Connection closed by peer.")
+        except BaseException:
+            self.__close(writer)
+            raise
+        status_line, headers, content = message
+        version, status_code = status_line.split(" ", 2)[:2]
+        if version == "HTTP/1.1" and headers.get("connection", "").lower() != "close":
+            self.idle.setdefault(peer.key, []).append((reader, writer))
+        else:
+            self.__close(writer)
+        return AsyncResponse(int(status_code), headers, content)
+
+    def __close(self, writer):
+        """
+        Close a connection.
+
+        Args:
+            writer: asyncio.StreamWriter of the connection
+        """
+        self.__counters["connections_closed"] += 1
+        writer.close()
+
+
+class AsyncHost(Host):
+    """
+    Host sending its requests as coroutines on the asyncio event loop.
+
+    The decisions on heartbeats, votes and joining the cluster are made by the Host methods,
+    only the communication with the other services is asynchronous.
+
+    Attributes:
+        request_timeout: float, Timeout in seconds for requests other than heartbeats.
+    """
+
+    def __init__(self, host, port, search_list, masterscript, slavescript, heartbeat_timeout=0.5,
+                 request_timeout=5.0, **kwargs):
+        """
+        Init AsyncHost.
+
+        Args:
+            host: hostname or ip of the host service
+            port: port of the host service
+            search_list: List of possible peers for autodetection
+            masterscript: Name of the masterscript that will be executed by the master on change.
+            slavescript: Name of the slavescript that will be executed by the slaves on change.
+            heartbeat_timeout: Timeout in seconds for a single heartbeat request.
+            request_timeout: Timeout in seconds for requests other than heartbeats.
+        """
+        super().__init__(host, port, search_list, masterscript, slavescript, heartbeat_timeout, **kwargs)
+        self.request_timeout = request_timeout
+
+    def _init_transport(self, max_workers):
+        """
+        Create the asyncio connection pool. No worker threads are needed, requests run as tasks on the loop.
+
+        Args:
+            max_workers: unused
+        """
+        self.executor = None
+        self.connections = AsyncConnectionPool()
+
+    async def start(self):
+        """
+        Start the host, adding it to the cluster.
+
+        All peers of the searchlist are probed concurrently, afterwards the host requests to join the cluster.
+
+        Raises:
+            JoiningClusterError: An error occured during the process of joining the cluster.
+        """
+        self.peers = Membership()
+        results = await asyncio.gather(*(self.__probe(peer) for peer in self.search_list))
+        for peer, r in zip(self.search_list, results):
+            if r is not None:
+                self._found_peer(peer, r)
+        if len(self.peers) == 0:
+            self.master = self
+        results = await asyncio.gather(*(self.__request(self.connections.post, peer, "/new_node", self.to_dict())
+                                         for peer in self.peers))
+        for peer, r in zip(self.peers.copy(), results):
+            if r is None:
+                raise JoiningClusterError
+            self._joined_peer(peer, r)
+        if self.master is None:
+            raise JoiningClusterError
+        self.update_master(self.master)
+
+    async def request_heartbeats(self):
+        """
+        Send a heartbeart request to all current peers concurrently.
+
+        UDP heartbeats are sent and collected by a single thread of the default executor.
+
+        Two consecutive missed heartbeats result in death, peer is then removed from cluster.
+        If the dead peer is the master a vote is triggered by the peer with the highest ID.
+        """
+        peers = self.peers.copy()
+        if self.udp is not None:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(None, self.udp.probe, peers, self.heartbeat_timeout)
+        else:
+            results = await asyncio.gather(*(self.__send_heartbeat(peer) for peer in peers))
+        if self._evaluate_heartbeats(peers, results):
+            await self.start_vote()
+
+    async def start_vote(self):
+        """
+        Trigger the voting process.
+        """
+        await self.__cast_vote(self._voting_message())
+
+    async def vote(self, votes_dict):
+        """
+        Vote when receiving a vote request.
+
+        If the host is the starter of the vote and received the final voting message back
+        it will determine the new master and announce it to all peers concurrently,
+        retrying announcements that were not acknowledged within announce_timeout.
+
+        Args:
+            votes_dict: current vote count (id: int), starter id and old_master id in a dict
+        """
+        if votes_dict["starter"] != self.id:
+            await self.__cast_vote(votes_dict)
+            return
+        new_master = self._elect(votes_dict)
+        if new_master is None:
+            return
+        peers = self.peers.copy()
+        acks = await asyncio.gather(*(self.__send_new_master(peer, new_master.to_dict()) for peer in peers))
+        self._tally_announcement(new_master, peers, acks)
+
+    async def __send_new_master(self, peer, payload):
+        """
+        Announce the new master to a peer, retrying if it does not acknowledge in time.
+
+        Returns:
+            True if the peer acknowledged the new master, False if not.
+        """
+        for attempt in range(self.announce_retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(0.05 * 2 ** (attempt - 1))
+            try:
+                r = await self.connections.post(peer, "/new_master", payload, timeout=self.announce_timeout)
+            except (OSError, asyncio.TimeoutError):
+                continue
+            if r.status_code == 200:
+                return True
+        return False
+
+    async def __cast_vote(self, votes_dict):
+        """
+        Vote for a new master and send the voting message to the next peer, or back to the starter on failure.
+
+        Args:
+            votes_dict: current vote count
+        """
+        next_peer, starter = self._next_vote_hop(votes_dict)
+        logging.info("sending vote to {}".format(next_peer))
+        r = await self.__request(self.connections.post, next_peer, "/vote", votes_dict)
+        if r is not None and r.status_code == 200:
+            return
+        logging.error("{} did not accept voting message. Sending vote back to starter.".format(next_peer))
+        if starter is not None:
+            r = await self.__request(self.connections.post, starter, "/vote", votes_dict)
+            if r is None or r.status_code != 200:
+                logging.error("Vote starter {} did not accept voting message back. "
+                              "Everything is over, nothing works anymore.".format(starter))
+
+    async def __send_heartbeat(self, peer):
+        """
+        Send a single heartbeat request to a peer.
+
+        Returns:
+            True if the peer answered with pong, False if it could not be reached within heartbeat_timeout
+            and None if it answered with something else.
+        """
+        try:
+            r = await self.connections.get(peer, "/heartbeat", timeout=self.heartbeat_timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        return self._heartbeat_answer(r)
+
+    async def __probe(self, peer):
+        """
+        Request / of a possible peer.
+
+        Returns:
+            AsyncResponse, None if the peer could not be reached.
+        """
+        return await self.__request(self.connections.get, peer, "/")
+
+    async def __request(self, send, peer, path, *args):
+        """
+        Send a request with the request timeout.
+
+        Args:
+            send: get or post method of the connection pool
+            peer: Peer the request is sent to.
+            path: Path of the request.
+            args: Further arguments of the send method.
+
+        Returns:
+            AsyncResponse, None if the request failed.
+        """
+        try:
+            return await send(peer, path, *args, timeout=self.request_timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+
+
+class AsyncServer:
+    """
+    HTTP/1.1 server of the service running on the asyncio event loop.
+
+    Connections are kept alive and closed after being idle for timeout seconds.
+    Background work of a request, e.g. voting, runs as a task on the same loop.
+
+    Attributes:
+        host: Host, Host the service is started on.
+        timeout: float, Seconds an idle connection is kept open.
+        tasks: set, Running background tasks.
+        handlers: set, Tasks answering the open connections.
+    """
+
+    def __init__(self, host, timeout=3, udp_heartbeat=False):
+        """
+        Init the server.
+
+        Args:
+            host: Host, host corresponding to the server.
+            timeout: Seconds an idle connection is kept open.
+            udp_heartbeat: True to answer UDP heartbeats.
+
+        Raises:
+            OSError: The address is already in use.
+        """
+        self.host = host
+        self.timeout = timeout
+        self.udp_responder = UDPHeartbeatResponder(host) if udp_heartbeat else None
+        self.tasks = set()
+        self.handlers = set()
+        self.__server = None
+
+    async def start(self):
+        """
+        Start accepting connections.
+
+        Raises:
+            OSError: The address is already in use.
+        """
+        self.__server = await asyncio.start_server(self.__handle_connection, self.host.host, self.host.port)
+        logging.info("HTTP server started")
+        if self.udp_responder is not None:
+            self.udp_responder.start()
+
+    async def stop(self):
+        """
+        Stop the server, closing all connections and cancelling the background tasks.
+        """
+        logging.info("HTTP server stopped")
+        if self.udp_responder is not None:
+            self.udp_responder.stop()
+        self.__server.close()
+        tasks = list(self.handlers) + list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.__server.wait_closed()
+
+    def spawn(self, function, *args):
+        """
+        Run a function in the background.
+
+        Coroutine functions run as task on the loop, other functions in the default executor.
+
+        Args:
+            function: function to run
+            args: arguments of the function
+        """
+        loop = asyncio.get_running_loop()
+        if asyncio.iscoroutinefunction(function):
+            task = loop.create_task(function(*args))
+        else:
+            task = asyncio.ensure_future(loop.run_in_executor(None, function, *args))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def __handle_connection(self, reader, writer):
+        """
+        Answer the requests of a connection until it is closed or idle for too long.
+        """
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(read_http_message(reader), self.timeout)
+                except (OSError, asyncio.TimeoutError):
+                    break
+                if message is None:
+                    break
+                request_line, headers, body = message
+                try:
+                    method, path, version = request_line.split(" ")
+                except ValueError:
+                    break
+                response = dispatch(self.host, Request(method, path, headers, body, self.spawn))
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write("HTTP/1.1 {} {}\r\nContent-type: {}\r\nContent-Length: {}\r\n{}\r\n".format(
+                    response.status, HTTPStatus(response.status).phrase, response.content_type, len(response.body),
+                    "" if keep_alive else "Connection: close\r\n").encode('latin-1') + response.body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            self.handlers.discard(task)
+            writer.close()
+
+
+async def run(host, server, interval=1):
+    """
+    Run the service on the event loop until it is cancelled.
+
+    Starts the server, adds the host to the cluster and requests heartbeats every interval seconds.
+
+    Args:
+        host: AsyncHost of the service
+        server: AsyncServer of the service
+        interval: Seconds between two heartbeat rounds.
+
+    Raises:
+        OSError: The address is already in use.
+        JoiningClusterError: Could not join the cluster.
+    """
+    await server.start()
+    try:
+        await host.start()
+        while True:
+            await asyncio.sleep(interval)
+            await host.request_heartbeats()
+    finally:
+        await server.stop()
+        host.connections.close()
@@ -6,10 +6,14 @@ to determine which controller is the master server in a high availabitlity clust
 """
 
 import argparse
+import asyncio
 import threading
 import time
 import logging
 import sys
+from netzwerkprogrammierung import aio
+from netzwerkprogrammierung.aio import AsyncHost, AsyncServer
+from netzwerkprogrammierung.detector import PhiAccrualDetector, TwoMissDetector
 from netzwerkprogrammierung.errors import JoiningClusterError
 from netzwerkprogrammierung.peer import Peer
 from netzwerkprogrammierung.host import Host
@@ -33,15 +37,69 @@ def main():
                         help="Script that will be executed by the new master after the master changes. Default: masterscript.sh")
     parser.add_argument("--slavescript", default="slavescript.sh",
                         help="Script that will be executed by every slave after the master changes. Default: slavescript.sh")
+    parser.add_argument("--heartbeat-timeout", type=float, default=0.5,
+                        help="Timeout in seconds for a single heartbeat request. Default: 0.5")
+    parser.add_argument("--workers", type=int, default=64,
+                        help="Maximum number of requests sent concurrently to peers. Default: 64")
+    parser.add_argument("--server-mode", choices=Server.MODES, default="threaded",
+                        help="'threaded' handles connections concurrently and keeps them alive, "
+                             "'single' handles one request at a time. Default: threaded")
+    parser.add_argument("--max-connections", type=int, default=256,
+                        help="Maximum number of connections handled concurrently in threaded mode. Default: 256")
+    parser.add_argument("--heartbeat", choices=("http", "udp"), default="http",
+                        help="Send heartbeats as HTTP requests or as compact UDP datagrams. Default: http")
+    parser.add_argument("--heartbeat-interval", type=float, default=1,
+                        help="Seconds between two heartbeat rounds, e.g. 0.1 with UDP heartbeats. Default: 1")
+    parser.add_argument("--detector", choices=("two-miss", "phi"), default="two-miss",
+                        help="'two-miss' declares a peer dead after two missed heartbeats, 'phi' uses an adaptive "
+                             "phi accrual failure detector. Default: two-miss")
+    parser.add_argument("--phi-threshold", type=float, default=8,
+                        help="Suspicion level phi at which a peer is declared dead. Default: 8")
+    parser.add_argument("--failure-detection", choices=("heartbeat", "swim"), default="heartbeat",
+                        help="'heartbeat' sends heartbeats to all peers every round, 'swim' probes one random peer "
+                             "per round and gossips suspicions and membership changes. "
+                             "'swim' requires the threading runtime. Default: heartbeat")
+    parser.add_argument("--election", choices=("ring", "bully"), default="ring",
+                        help="'ring' passes the votes from peer to peer, 'bully' elects the highest ID with concurrent "
+                             "requests in a constant number of round trips. 'bully' requires the threading runtime. "
+                             "Default: ring")
+    parser.add_argument("--runtime", choices=("threading", "asyncio"), default="threading",
+                        help="'threading' runs the server, heartbeats and votes in threads, "
+                             "'asyncio' runs all of them on a single event loop. Default: threading")
     args = parser.parse_args()
+    if args.failure_detection == "swim" and args.runtime == "asyncio":
+        parser.error("--failure-detection swim requires --runtime threading")
+    if args.election == "bully" and args.runtime == "asyncio":
+        parser.error("--election bully requires --runtime threading")
     possible_peers = []
     for peer in args.searchlist.split(','):
         peer_split = peer.split(":")
         if len(peer_split) == 2:
             possible_peers.append(Peer(peer_split[0], peer_split[1]))
-    host = Host(args.host, args.port, possible_peers, args.masterscript, args.slavescript)
+    if args.detector == "phi":
+        args.failure_detector = PhiAccrualDetector(args.phi_threshold, first_interval=args.heartbeat_interval)
+    else:
+        args.failure_detector = TwoMissDetector()
+    if args.runtime == "asyncio":
+        run_asyncio(args, possible_peers)
+    else:
+        run_threading(args, possible_peers)
+
+
+def run_threading(args, possible_peers):
+    """
+    Run the service with a server thread and heartbeat requests in the main thread.
+
+    Args:
+        args: parsed command line arguments
+        possible_peers: list of possible peers from the searchlist
+    """
+    host = Host(args.host, args.port, possible_peers, args.masterscript, args.slavescript,
+                heartbeat_timeout=args.heartbeat_timeout, max_workers=args.workers,
+                heartbeat_transport=args.heartbeat, failure_detection=args.failure_detection,
+                failure_detector=args.failure_detector, election=args.election)
     try:
-        server = Server(host)
+        server = Server(host, args.server_mode, args.max_connections, udp_heartbeat=args.heartbeat == "udp")
     except OSError:
         logging.error("Address already in use. Exiting.")
         sys.exit(1)
@@ -56,9 +114,33 @@ def main():
         sys.exit(1)
     try:
         while True:
-            time.sleep(1)
+            time.sleep(args.heartbeat_interval)
             host.request_heartbeats()
     except KeyboardInterrupt:
         logging.info("Terminating.")
         server.stop_server()
         server_thread.join()
+
+
+def run_asyncio(args, possible_peers):
+    """
+    Run the service on a single asyncio event loop.
+
+    Args:
+        args: parsed command line arguments
+        possible_peers: list of possible peers from the searchlist
+    """
+    host = AsyncHost(args.host, args.port, possible_peers, args.masterscript, args.slavescript,
+                     heartbeat_timeout=args.heartbeat_timeout, heartbeat_transport=args.heartbeat,
+                     failure_detector=args.failure_detector, election=args.election)
+    try:
+        server = AsyncServer(host, udp_heartbeat=args.heartbeat == "udp")
+        asyncio.run(aio.run(host, server, args.heartbeat_interval))
+    except OSError:
+        logging.error("Address already in use. Exiting.")
+        sys.exit(1)
+    except JoiningClusterError:
+        logging.error("Could not join cluster. Exiting.")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        logging.info("Terminating.")
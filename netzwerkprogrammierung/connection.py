@@ -0,0 +1,167 @@
+"""
+In this module the ConnectionPool class is defined.
+"""
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ConnectionPool:
+    """
+    Pool of persistent HTTP connections to the peer services.
+
+    One requests.Session is kept per peer, which holds HTTP/1.1 keep-alive connections open,
+    so consecutive requests to the same peer reuse the established TCP connection.
+    After a failed request the session of the peer is closed and a fresh one
+    is created with the next request.
+
+    Attributes:
+        maxsize: int, Number of connections kept open per peer.
+        sessions: {int: requests.Session}, Open sessions by peer key.
+        lock: threading.Lock, Lock protecting the sessions and counters.
+    """
+
+    def __init__(self, maxsize=2):
+        """
+        Init the connection pool.
+
+        Args:
+            maxsize: Number of connections kept open per peer.
+        """
+        self.maxsize = maxsize
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.__counters = {"requests": 0, "failures": 0, "sessions_created": 0, "sessions_closed": 0}
+
+    def get(self, peer, path, timeout=None, **kwargs):
+        """
+        Send a GET request to a peer.
+
+        Args:
+            peer: Peer the request is sent to.
+            path: Path of the request, e.g. /heartbeat
+            timeout: Timeout in seconds, None to wait forever.
+
+        Returns:
+            requests.Response of the peer.
+
+        Raises:
+            requests.exceptions.RequestException: The request failed.
+        """
+        return self.request("GET", peer, path, timeout=timeout, **kwargs)
+
+    def post(self, peer, path, payload=None, timeout=None, **kwargs):
+        """
+        Send a POST request with a json payload to a peer.
+
+        Args:
+            peer: Peer the request is sent to.
+            path: Path of the request, e.g. /vote
+            payload: Object that is sent json encoded.
+            timeout: Timeout in seconds, None to wait forever.
+
+        Returns:
+            requests.Response of the peer.
+
+        Raises:
+            requests.exceptions.RequestException: The request failed.
+        """
+        return self.request("POST", peer, path, timeout=timeout, json=payload, **kwargs)
+
+    def request(self, method, peer, path, timeout=None, **kwargs):
+        """
+        Send a request to a peer over its persistent session.
+
+        If the request fails, the session of the peer is closed so the next request reconnects.
+
+        Args:
+            method: HTTP method
+            peer: Peer the request is sent to.
+            path: Path of the request.
+            timeout: Timeout in seconds, None to wait forever.
+            kwargs: Further arguments passed to requests.Session.request
+
+        Returns:
+            requests.Response of the peer.
+
+        Raises:
+            requests.exceptions.RequestException: The request failed.
+        """
+        session = self.__session(peer)
+        try:
+            r = session.request(method, peer.url(path), timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            self.__count("failures")
+            self.reset(peer)
+            raise
+        self.__count("requests")
+        return r
+
+    def reset(self, peer):
+        """
+        Close the session of a peer, e.g. after it failed or left the cluster.
+
+        Args:
+            peer: Peer whose connections are closed.
+        """
+        with self.lock:
+            session = self.sessions.pop(peer.key, None)
+            if session is not None:
+                self.__counters["sessions_closed"] += 1
+        if session is not None:
+            session.close()
+
+    def close(self):
+        """
+        Close all sessions of the pool.
+        """
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.__counters["sessions_closed"] += len(sessions)
+            self.sessions = {}
+        for session in sessions:
+            session.close()
+
+    def stats(self):
+        """
+        Get statistics of the pool.
+
+        Returns:
+            dict with the number of open sessions, sent requests, failed requests,
+            created and closed sessions.
+        """
+        with self.lock:
+            stats = dict(self.__counters)
+            stats["open_sessions"] = len(self.sessions)
+        return stats
+
+    def __session(self, peer):
+        """
+        Get the session of a peer, creating it if there is none.
+
+        Args:
+            peer: Peer of the session.
+
+        Returns:
+            requests.Session for the peer.
+        """
+        with self.lock:
+            session = self.sessions.get(peer.key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.maxsize)
+                session.mount("http://", adapter)
+                self.sessions[peer.key] = session
+                self.__counters["sessions_created"] += 1
+            return session
+
+    def __count(self, counter):
+        """
+        Increase a counter by one.
+
+        Args:
+            counter: name of the counter
+        """
+        with self.lock:
+            self.__counters[counter] += 1
@@ -0,0 +1,177 @@
+"""
+This module includes the failure detectors deciding when a peer is dead.
+
+A failure detector gets the result of every heartbeat and answers with the state of the peer:
+ALIVE, SUSPECT or DEAD. TwoMissDetector declares a peer dead after two consecutive missed heartbeats,
+PhiAccrualDetector adapts to the observed heartbeat inter-arrival times.
+"""
+
+import collections
+import math
+import threading
+
+ALIVE = "alive"
+SUSPECT = "suspect"
+DEAD = "dead"
+
+
+class TwoMissDetector:
+    """
+    Failure detector declaring a peer dead after two consecutive missed heartbeats.
+    """
+
+    def __init__(self):
+        """
+        Init the detector.
+        """
+        self.lock = threading.Lock()
+        self.__misses = {}
+
+    def report(self, peer, alive, now):
+        """
+        Record the result of a heartbeat.
+
+        Args:
+            peer: peer the heartbeat was sent to
+            alive: True if the peer answered, False if not
+            now: current time in seconds
+
+        Returns:
+            ALIVE, SUSPECT or DEAD
+        """
+        with self.lock:
+            if alive:
+                self.__misses.pop(peer.key, None)
+                return ALIVE
+            misses = self.__misses.get(peer.key, 0) + 1
+            self.__misses[peer.key] = misses
+        return DEAD if misses >= 2 else SUSPECT
+
+    def level(self, peer, now):
+        """
+        Suspicion level of a peer.
+
+        Returns:
+            number of consecutive missed heartbeats
+        """
+        return self.__misses.get(peer.key, 0)
+
+    def forget(self, peer):
+        """
+        Remove the state of a peer that left the cluster.
+        """
+        with self.lock:
+            self.__misses.pop(peer.key, None)
+
+
+class PhiAccrualDetector:
+    """
+    Phi accrual failure detector.
+
+    For every peer a sliding window of heartbeat inter-arrival times is kept. The suspicion level phi is
+    -log10 of the probability that a heartbeat arrives even later than now, assuming normally distributed
+    inter-arrival times. A peer missing a heartbeat is suspected, and declared dead once phi exceeds the threshold.
+    On a steady network this happens shortly after the expected arrival, on a jittery one it takes longer.
+
+    Attributes:
+        threshold: float, phi at which a peer is declared dead.
+        window: int, Number of inter-arrival times kept per peer.
+        min_std: float, Lower bound of the standard deviation in seconds.
+        first_interval: float, Expected inter-arrival time in seconds before any was measured.
+    """
+
+    def __init__(self, threshold=8.0, window=100, min_std=0.1, first_interval=1.0):
+        """
+        Init the detector.
+
+        Args:
+            threshold: phi at which a peer is declared dead.
+            window: Number of inter-arrival times kept per peer.
+            min_std: Lower bound of the standard deviation in seconds.
+            first_interval: Expected inter-arrival time in seconds before any was measured.
+        """
+        self.threshold = threshold
+        self.window = window
+        self.min_std = min_std
+        self.first_interval = first_interval
+        self.lock = threading.Lock()
+        self.__intervals = {}
+        self.__last = {}
+
+    def report(self, peer, alive, now):
+        """
+        Record the result of a heartbeat.
+
+        Args:
+            peer: peer the heartbeat was sent to
+            alive: True if the peer answered, False if not
+            now: current time in seconds
+
+        Returns:
+            ALIVE, SUSPECT or DEAD
+        """
+        with self.lock:
+            last = self.__last.get(peer.key)
+            if alive:
+                if last is not None:
+                    intervals = self.__intervals.setdefault(peer.key, collections.deque(maxlen=self.window))
+                    intervals.append(now - last)
+                self.__last[peer.key] = now
+                return ALIVE
+            if last is None:
+                # never heard of it, start measuring from the first missed heartbeat
+                self.__last[peer.key] = now
+                return SUSPECT
+        return DEAD if self.level(peer, now) >= self.threshold else SUSPECT
+
+    def level(self, peer, now):
+        """
+        Suspicion level phi of a peer.
+
+        Args:
+            peer: peer
+            now: current time in seconds
+
+        Returns:
+            phi, 0.0 if no heartbeat was received from the peer yet.
+        """
+        with self.lock:
+            last = self.__last.get(peer.key)
+            if last is None:
+                return 0.0
+            intervals = self.__intervals.get(peer.key)
+            if intervals:
+                mean = sum(intervals) / len(intervals)
+                std = math.sqrt(sum((i - mean) ** 2 for i in intervals) / len(intervals))
+            else:
+                mean = self.first_interval
+                std = self.first_interval / 4
+        return phi(now - last, mean, max(std, self.min_std))
+
+    def forget(self, peer):
+        """
+        Remove the state of a peer that left the cluster.
+        """
+        with self.lock:
+            self.__intervals.pop(peer.key, None)
+            self.__last.pop(peer.key, None)
+
+
+def phi(elapsed, mean, std):
+    """
+    Compute phi with the logistic approximation of the normal distribution.
+
+    Args:
+        elapsed: seconds since the last heartbeat
+        mean: mean inter-arrival time in seconds
+        std: standard deviation of the inter-arrival time in seconds
+
+    Returns:
+        -log10 of the probability that the next heartbeat arrives later than elapsed
+    """
+    y = (elapsed - mean) / std
+    # the exponent is bounded so far outliers neither overflow nor give an infinite phi
+    e = math.exp(max(-700.0, min(700.0, -y * (1.5976 + 0.070566 * y * y))))
+    if elapsed > mean:
+        return -math.log10(e / (1.0 + e))
+    return -math.log10(1.0 - 1.0 / (1.0 + e))
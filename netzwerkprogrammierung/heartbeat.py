@@ -0,0 +1,223 @@
+"""
+This module includes the UDP heartbeat transport.
+
+A heartbeat is a single fixed-size datagram, answered by a datagram of the same format:
+
+    type (1 byte, ping or pong), sender ID (32 bytes), sequence number (4 bytes), timestamp (8 bytes)
+
+The pong echoes sequence number and timestamp of the ping, so the sender can measure loss and round trip time.
+The datagrams are sent to the same port number the HTTP service listens on.
+"""
+
+import logging
+import socket
+import struct
+import threading
+import time
+
+PING = 1
+PONG = 2
+DATAGRAM = struct.Struct("!B32sIQ")
+
+
+def encode(kind, peer_id, seq, timestamp):
+    """
+    Encode a heartbeat datagram.
+
+    Args:
+        kind: PING or PONG
+        peer_id: hex ID of the sender
+        seq: sequence number
+        timestamp: timestamp of the ping in nanoseconds
+
+    Returns:
+        bytes of the datagram
+    """
+    return DATAGRAM.pack(kind, bytes.fromhex(peer_id), seq & 0xFFFFFFFF, timestamp)
+
+
+def decode(data):
+    """
+    Decode a heartbeat datagram.
+
+    Args:
+        data: received bytes
+
+    Returns:
+        (kind, hex ID of the sender, sequence number, timestamp) tuple, None if the datagram is malformed.
+    """
+    if len(data) != DATAGRAM.size:
+        return None
+    kind, peer_id, seq, timestamp = DATAGRAM.unpack(data)
+    return kind, peer_id.hex(), seq, timestamp
+
+
+class UDPHeartbeatResponder:
+    """
+    Answers heartbeat pings with pongs in a background thread.
+
+    Attributes:
+        host: Host the responder belongs to.
+        sock: socket.socket, UDP socket bound to the address of the host.
+    """
+
+    def __init__(self, host):
+        """
+        Init the responder and bind its socket.
+
+        Args:
+            host: Host the responder belongs to.
+
+        Raises:
+            OSError: The address is already in use.
+        """
+        self.host = host
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host.host, int(host.port)))
+        self.sock.settimeout(0.5)
+        self.__running = False
+        self.__thread = None
+
+    def start(self):
+        """
+        Start answering pings in a daemon thread.
+        """
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__serve, daemon=True)
+        self.__thread.start()
+        logging.info("UDP heartbeat responder started")
+
+    def stop(self):
+        """
+        Stop answering pings and close the socket.
+        """
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+        self.sock.close()
+
+    def __serve(self):
+        """
+        Answer pings until stopped.
+        """
+        while self.__running:
+            try:
+                data, address = self.sock.recvfrom(DATAGRAM.size + 1)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            message = decode(data)
+            if message is None or message[0] != PING:
+                continue
+            try:
+                self.sock.sendto(encode(PONG, self.host.id, message[2], message[3]), address)
+            except OSError:
+                pass
+
+
+class UDPHeartbeatClient:
+    """
+    Sends heartbeat pings to the peers and collects the pongs.
+
+    For every peer the number of sent and answered pings and the round trip times are recorded.
+
+    Attributes:
+        host: Host sending the pings.
+        sock: socket.socket, unbound UDP socket used for the pings.
+        seq: int, sequence number of the last round.
+        peer_stats: {str: dict}, statistics by peer id with sent, received, lost, last_rtt and avg_rtt in seconds.
+    """
+
+    def __init__(self, host):
+        """
+        Init the client.
+
+        Args:
+            host: Host sending the pings.
+        """
+        self.host = host
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.seq = 0
+        self.peer_stats = {}
+        self.lock = threading.Lock()
+
+    def probe(self, peers, timeout):
+        """
+        Send a ping to every peer and wait for the pongs.
+
+        Args:
+            peers: peers to ping
+            timeout: seconds to wait for the pongs
+
+        Returns:
+            list with True for every peer that answered within timeout, False otherwise.
+        """
+        with self.lock:
+            self.seq = (self.seq + 1) & 0xFFFFFFFF
+            pending = {}
+            for peer in peers:
+                stats = self.peer_stats.setdefault(peer.id, {"sent": 0, "received": 0, "lost": 0,
+                                                             "last_rtt": None, "avg_rtt": None})
+                try:
+                    self.sock.sendto(encode(PING, self.host.id, self.seq, time.monotonic_ns()),
+                                     (peer.host, int(peer.port)))
+                except OSError:
+                    pass
+                stats["sent"] += 1
+                pending[peer.id] = stats
+            answered = set()
+            deadline = time.monotonic() + timeout
+            while pending.keys() - answered:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.sock.settimeout(remaining)
+                try:
+                    data = self.sock.recv(DATAGRAM.size + 1)
+                except socket.timeout:
+                    break
+                except OSError:
+                    # e.g. ICMP port unreachable of a dead peer reported on the socket
+                    continue
+                message = decode(data)
+                if message is None:
+                    continue
+                kind, peer_id, seq, timestamp = message
+                if kind != PONG or seq != self.seq or peer_id not in pending or peer_id in answered:
+                    continue
+                answered.add(peer_id)
+                rtt = (time.monotonic_ns() - timestamp) / 1e9
+                stats = pending[peer_id]
+                stats["received"] += 1
+                stats["last_rtt"] = rtt
+                stats["avg_rtt"] = rtt if stats["avg_rtt"] is None else 0.875 * stats["avg_rtt"] + 0.125 * rtt
+            for peer_id in pending.keys() - answered:
+                pending[peer_id]["lost"] += 1
+            return [peer.id in answered for peer in peers]
+
+    def forget(self, peer):
+        """
+        Remove the statistics of a peer that left the cluster.
+
+        Args:
+            peer: peer to forget
+        """
+        with self.lock:
+            self.peer_stats.pop(peer.id, None)
+
+    def stats(self):
+        """
+        Get the loss and round trip statistics of all peers.
+
+        Returns:
+            dict by peer id with sent, received, lost, last_rtt and avg_rtt in seconds.
+        """
+        with self.lock:
+            return {peer_id: dict(stats) for peer_id, stats in self.peer_stats.items()}
+
+    def close(self):
+        """
+        Close the socket.
+        """
+        self.sock.close()
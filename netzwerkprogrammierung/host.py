@@ -2,12 +2,19 @@
 In this module the Host class is defined.
 """
 
+import concurrent.futures
 import requests
 import logging
 import subprocess
 import threading
+import time
+from netzwerkprogrammierung.connection import ConnectionPool
+from netzwerkprogrammierung.detector import ALIVE, DEAD, TwoMissDetector
 from netzwerkprogrammierung.errors import JoiningClusterError, VotingError
+from netzwerkprogrammierung.heartbeat import UDPHeartbeatClient
+from netzwerkprogrammierung.membership import Membership
 from netzwerkprogrammierung.peer import Peer
+from netzwerkprogrammierung.swim import SwimDetector
 
 
 class Host(Peer):
@@ -20,14 +27,28 @@ class Host(Peer):
 
     Attributes:
         search_list: type [Peer], List of possible peers
-        peers: [Peer], List of currently active peers
+        peers: Membership, Registry of the currently active peers
         master: Peer, Current master
         masterscript: str, Name of the masterscript that will be executed by the master on change.
         slavescript: str,  Name of the slavescript that will be executed by the slaves on change.
         lock: threading.Lock, Lock that will used so make sure threads are not inferring with each other
+        heartbeat_timeout: float, Seconds a single heartbeat request may take before it counts as missed.
+        executor: concurrent.futures.ThreadPoolExecutor, Bounded worker pool used to send requests concurrently.
+        connections: ConnectionPool, Persistent keep-alive connections to the peers.
+        udp: UDPHeartbeatClient, Client sending the heartbeats as UDP datagrams, None to send them via HTTP.
+        swim: SwimDetector, SWIM failure detector probing one peer per round, None to send heartbeats to all peers.
+        failure_detector: TwoMissDetector or PhiAccrualDetector, Decides on the heartbeat results when a peer is dead.
+        clock: callable, Returns the current time in seconds, time.monotonic by default.
+        election: str, "ring" to pass the votes around the ring, "bully" to elect the highest ID with concurrent requests.
+        election_timeout: float, Seconds to wait for the announcement of a peer that took over a bully election.
+        announce_timeout: float, Seconds a peer may take to acknowledge a new master.
+        announce_retries: int, Number of retries of an unacknowledged new master announcement.
+        announcement: dict, Result of the last announcement with the master id and the acked and missing peer ids.
     """
 
-    def __init__(self, host, port, search_list, masterscript, slavescript):
+    def __init__(self, host, port, search_list, masterscript, slavescript, heartbeat_timeout=0.5, max_workers=64,
+                 heartbeat_transport="http", failure_detection="heartbeat", failure_detector=None,
+                 election="ring", election_timeout=2.0, announce_timeout=1.0, announce_retries=2):
         """
         Init Host.
 
@@ -37,6 +58,17 @@ class Host(Peer):
             search_list: List of possible peers for autodetection
             masterscript: Name of the masterscript that will be executed by the master on change.
             slavescript: Name of the slavescript that will be executed by the slaves on change.
+            heartbeat_timeout: Timeout in seconds for a single heartbeat request.
+            max_workers: Maximum number of concurrent requests sent by the host.
+            heartbeat_transport: "http" to send heartbeats as HTTP requests, "udp" to send them as UDP datagrams.
+            failure_detection: "heartbeat" to send heartbeats to all peers every round,
+                               "swim" to probe a single peer per round and gossip the membership.
+            failure_detector: Failure detector for the heartbeat results, Default: TwoMissDetector
+            election: "ring" to pass the votes from peer to peer,
+                      "bully" to elect the highest ID in a constant number of round trips.
+            election_timeout: Seconds to wait for the announcement of a peer that took over a bully election.
+            announce_timeout: Seconds a peer may take to acknowledge a new master.
+            announce_retries: Number of retries of an unacknowledged new master announcement.
         """
         super().__init__(host, port)
         self.search_list = search_list
@@ -44,7 +76,30 @@ class Host(Peer):
         self.slavescript = slavescript
         self.lock = threading.RLock()
         self.master = None
-        self.peers = []
+        self.peers = Membership()
+        self.heartbeat_timeout = heartbeat_timeout
+        self._init_transport(max_workers)
+        self.udp = UDPHeartbeatClient(self) if heartbeat_transport == "udp" else None
+        self.swim = SwimDetector(self) if failure_detection == "swim" else None
+        self.failure_detector = failure_detector if failure_detector is not None else TwoMissDetector()
+        self.clock = time.monotonic
+        self.election = election
+        self.election_timeout = election_timeout
+        self.announce_timeout = announce_timeout
+        self.announce_retries = announce_retries
+        self.announcement = None
+        self.__elected = threading.Event()
+        self.__electing = False
+
+    def _init_transport(self, max_workers):
+        """
+        Create the worker pool and the connection pool used to communicate with the peers.
+
+        Args:
+            max_workers: Maximum number of concurrent requests sent by the host.
+        """
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.connections = ConnectionPool()
 
     def start(self):
         """
@@ -61,53 +116,151 @@ class Host(Peer):
 
     def add_peer(self, peer):
         """
-        Append new peer to list of peers.
+        Add new peer to the peers.
 
         Args:
-            peer: peer to add to list
+            peer: peer to add
+
+        Returns:
+            True if the peer was added, False if there already is a peer with the same ID.
         """
-        with self.lock:
-            for p in self.peers:
-                if peer.id == p.id:
-                    # Make sure there are no duplicates
-                    return False
-            self.peers.append(peer)
+        if not self.peers.add(peer):
+            return False
+        if self.swim is not None:
+            self.swim.joined(peer)
         return True
 
     def request_heartbeats(self):
         """
         Send a heartbeart request to all current peers.
 
+        The requests are sent concurrently, so a round takes about as long as the slowest answer
+        and at most heartbeat_timeout seconds, regardless of the number of peers.
+        The lock is only held to copy the peers and to evaluate the answers, not while waiting for them.
         Two consecutive missed heartbeats result in death, peer is then removed from cluster.
         If the dead peer is the master a vote is triggered by the peer with the highest ID.
+        With SWIM failure detection a single SWIM probe round is run instead.
+        """
+        if self.swim is not None:
+            self.swim.round()
+            return
+        with self.lock:
+            peers = self.peers.copy()
+        if self.udp is not None:
+            results = self.udp.probe(peers, self.heartbeat_timeout)
+        else:
+            results = list(self.executor.map(self.__send_heartbeat, peers))
+        if self._evaluate_heartbeats(peers, results):
+            self.start_vote()
+
+    def __send_heartbeat(self, peer):
+        """
+        Send a single heartbeat request to a peer.
+
+        Args:
+            peer: peer to send the heartbeat to
+
+        Returns:
+            True if the peer answered with pong, False if it could not be reached within heartbeat_timeout
+            and None if it answered with something else.
         """
+        try:
+            r = self.connections.get(peer, "/heartbeat", timeout=self.heartbeat_timeout)
+        except requests.exceptions.RequestException:
+            return False
+        return self._heartbeat_answer(r)
+
+    def _heartbeat_answer(self, response):
+        """
+        Evaluate the answer to a heartbeat request.
+
+        Args:
+            response: response with status_code and text
+
+        Returns:
+            True if the peer answered with pong, None if it answered with something else.
+        """
+        if response.status_code == 200 and response.text == "pong":
+            return True
+        return None
+
+    def _evaluate_heartbeats(self, peers, results):
+        """
+        Update the peers according to the results of a heartbeat round.
+
+        The failure detector decides whether a peer that missed a heartbeat is suspected or dead,
+        by default two consecutive missed heartbeats result in death. A dead peer is then removed from cluster.
+        If the dead peer is the master and this host has the highest ID, it has to start a vote.
+        If this host is the only one left, it becomes the new master.
+
+        Args:
+            peers: peers the heartbeats were sent to
+            results: result of the heartbeat for each peer, True, False or None
+
+        Returns:
+            True if this host has to start a vote, False if not.
+        """
+        now = self.clock()
         with self.lock:
-            for peer in self.peers:
-                try:
-                    r = requests.get("http://"+peer.host+":"+str(peer.port)+"/heartbeat")
-                except requests.exceptions.ConnectionError:
-                    if peer.active:
-                        peer.active = False
-                        logging.info("{} missed first heartbeat.".format(peer))
-                    else:
-                        logging.warning("{} missed second heartbeat and is determined dead.".format(peer))
-                        self.peers.remove(peer)
-                        if self.master is not None and peer.id == self.master.id:
-                            logging.warning("master is dead".format(peer))
-                            if len(self.peers) != 0:
-                                sorted_peers = sorted(self.peers, reverse=True, key=lambda p: p.id)
-                                if self.id > sorted_peers[0].id:
-                                    logging.info("starting vote".format(peer))
-                                    self.start_vote()
-                                else:
-                                    logging.info("waiting to vote".format(peer))
-                            else:
-                                logging.info("I am alone, and therefore the new master.")
-                                self.update_master(self)
-                                return
+            for peer, alive in zip(peers, results):
+                if alive is None or peer not in self.peers:
+                    # no clear answer, or the peer was removed while the heartbeats were sent
                     continue
-                if r.status_code == 200 and r.text == "pong":
+                state = self.failure_detector.report(peer, alive, now)
+                if state == ALIVE:
                     peer.active = True
+                elif state == DEAD:
+                    logging.warning("{} missed heartbeat and is determined dead.".format(peer))
+                    if self._peer_died(peer):
+                        return True
+                elif peer.active:
+                    peer.active = False
+                    logging.info("{} missed first heartbeat.".format(peer))
+        return False
+
+    def suspicion_levels(self):
+        """
+        Get the suspicion level of every peer from the failure detector.
+
+        Returns:
+            dict with the suspicion level by peer id, phi for PhiAccrualDetector,
+            the number of consecutive missed heartbeats for TwoMissDetector.
+        """
+        now = self.clock()
+        return {peer.id: self.failure_detector.level(peer, now) for peer in self.peers}
+
+    def _peer_died(self, peer):
+        """
+        Remove a dead peer from the cluster.
+
+        If the dead peer is the master and this host has the highest ID, it has to start a vote.
+        If this host is the only one left, it becomes the new master.
+
+        Args:
+            peer: dead peer
+
+        Returns:
+            True if this host has to start a vote, False if not.
+        """
+        with self.lock:
+            if self.peers.discard(peer.key) is None:
+                return False
+            self.connections.reset(peer)
+            self.failure_detector.forget(peer)
+            if self.udp is not None:
+                self.udp.forget(peer)
+            if self.master is None or peer.key != self.master.key:
+                return False
+            logging.warning("master is dead")
+            if len(self.peers) != 0:
+                if self.key > self.peers.highest().key:
+                    logging.info("starting vote")
+                    return True
+                logging.info("waiting to vote")
+                return False
+            logging.info("I am alone, and therefore the new master.")
+            self.update_master(self)
+            return False
 
     def start_vote(self):
         """
@@ -115,14 +268,92 @@ class Host(Peer):
 
         Will trigger the voting process by initializing the vote list, giving its vote
         and send the voting request to the next service.
+        With bully elections a bully election is run instead.
+        """
+        if self.election == "bully":
+            self.__run_election()
+            return
+        self.__cast_vote(self._voting_message())
+
+    def __run_election(self):
+        """
+        Elect the peer with the highest ID as new master, bully-style.
+
+        An election message is sent concurrently to all peers with a higher ID.
+        If none of them answers within heartbeat_timeout, this host becomes the new master and announces itself.
+        Otherwise a peer with a higher ID takes over the election, and the election is restarted
+        if it does not announce a new master within election_timeout.
+        As the highest remaining peer starts the election when the master died, this usually takes a single
+        round of announcements regardless of the cluster size.
+        """
+        with self.lock:
+            if self.__electing:
+                return
+            self.__electing = True
+        try:
+            while True:
+                higher = self._begin_election()
+                message = {"from": self.id}
+                if not any(self.executor.map(lambda peer: self.__send_election(peer, message), higher)):
+                    logging.info("No peer with a higher ID answered, I am the new master.")
+                    self.update_master(self)
+                    self._announce_master(self)
+                    return
+                logging.info("A peer with a higher ID took over the election.")
+                if self.__elected.wait(self.election_timeout):
+                    return
+                logging.warning("No new master was announced, restarting election.")
+        finally:
+            with self.lock:
+                self.__electing = False
+
+    def _begin_election(self):
+        """
+        Remove the old master from the peers and find the peers that take precedence in a bully election.
+
+        Returns:
+            list of the peers with a higher ID than this host
+        """
+        with self.lock:
+            old_master = self.master
+            self.master = None
+            self.__elected.clear()
+            if old_master is not None and old_master.key != self.key:
+                if self.peers.discard(old_master.key) is not None:
+                    self.connections.reset(old_master)
+            return [peer for peer in self.peers if peer.key > self.key]
+
+    def __send_election(self, peer, message):
+        """
+        Send an election message to a peer with a higher ID.
+
+        Args:
+            peer: peer with a higher ID
+            message: election message
+
+        Returns:
+            True if the peer answered and takes over the election, False if not.
+        """
+        try:
+            r = self.connections.post(peer, "/election", message, timeout=self.heartbeat_timeout)
+        except requests.exceptions.RequestException:
+            return False
+        return r.status_code == 200
+
+    def _voting_message(self):
+        """
+        Initialize the voting message with zero votes for every node.
+
+        Returns:
+            vote count (id: int), starter id and old_master id in a dict
         """
         with self.lock:
             all_peers = self.peers.copy()
-        all_peers.append(Peer(self.host, self.port))
+        all_peers.append(self)
         voting_message = {p.id: 0 for p in all_peers}
         voting_message["starter"] = self.id
         voting_message["old_master"] = self.master.id
-        self.__cast_vote(voting_message)
+        return voting_message
 
     def vote(self, votes_dict):
         """
@@ -138,32 +369,100 @@ class Host(Peer):
         """
         if votes_dict["starter"] == self.id:
             # this node is starter and can announce the new master
-            del(votes_dict["starter"])
-            del(votes_dict["old_master"])
-            sorted_votes = [k for k, v in sorted(votes_dict.items(), reverse=True, key=lambda item: item[1])]
-            new_master = None
-            for p in self.peers:
-                if p.id == sorted_votes[0]:
-                    new_master = p
+            new_master = self._elect(votes_dict)
             if new_master is None:
-                if self.id == sorted_votes[0]:
-                    new_master = self
-                else:
-                    logging.error("Could not determine new master.")
-                    return
-            logging.info("new master is {}".format(new_master))
-            self.update_master(new_master)
-            for peer in self.peers:
-                try:
-                    r = requests.post("http://" + peer.host + ":" + str(peer.port) + "/new_master",
-                                      json=new_master.to_dict())
-                    if r.status_code != 200:
-                        raise requests.exceptions.ConnectionError
-                except requests.exceptions.ConnectionError:
-                    logging.error("{} did not answer request update master successfully.".format(peer))
+                return
+            self._announce_master(new_master)
         else:
             self.__cast_vote(votes_dict)
 
+    def _announce_master(self, new_master):
+        """
+        Announce the new master to all peers concurrently.
+
+        Every peer has announce_timeout seconds to acknowledge the announcement, which is retried
+        up to announce_retries times, so one hung peer does not delay the others.
+
+        Args:
+            new_master: elected master
+
+        Returns:
+            list of the peers that did not acknowledge the new master
+        """
+        peers = self.peers.copy()
+        payload = new_master.to_dict()
+        acks = list(self.executor.map(lambda peer: self.__send_new_master(peer, payload), peers))
+        return self._tally_announcement(new_master, peers, acks)
+
+    def __send_new_master(self, peer, payload):
+        """
+        Announce the new master to a peer, retrying if it does not acknowledge in time.
+
+        Args:
+            peer: peer to announce the new master to
+            payload: new master as dict
+
+        Returns:
+            True if the peer acknowledged the new master, False if not.
+        """
+        for attempt in range(self.announce_retries + 1):
+            if attempt > 0:
+                time.sleep(0.05 * 2 ** (attempt - 1))
+            try:
+                r = self.connections.post(peer, "/new_master", payload, timeout=self.announce_timeout)
+            except requests.exceptions.RequestException:
+                continue
+            if r.status_code == 200:
+                return True
+        return False
+
+    def _tally_announcement(self, new_master, peers, acks):
+        """
+        Record which peers acknowledged the new master.
+
+        Args:
+            new_master: announced master
+            peers: peers the master was announced to
+            acks: True for every peer that acknowledged the new master, False otherwise
+
+        Returns:
+            list of the peers that did not acknowledge the new master
+        """
+        missing = [peer for peer, ack in zip(peers, acks) if not ack]
+        self.announcement = {
+            "master": new_master.id,
+            "acked": [peer.id for peer, ack in zip(peers, acks) if ack],
+            "missing": [peer.id for peer in missing],
+        }
+        for peer in missing:
+            logging.error("{} did not answer request update master successfully.".format(peer))
+        logging.info("{} of {} peers acknowledged the new master.".format(len(peers) - len(missing), len(peers)))
+        return missing
+
+    def _elect(self, votes_dict):
+        """
+        Determine the new master from the final vote count and update the master.
+
+        Args:
+            votes_dict: final vote count (id: int), starter id and old_master id in a dict
+
+        Returns:
+            The new master, None if it could not be determined.
+        """
+        del(votes_dict["starter"])
+        del(votes_dict["old_master"])
+        sorted_votes = [k for k, v in sorted(votes_dict.items(), reverse=True, key=lambda item: item[1])]
+        new_master = self.peers.get(sorted_votes[0])
+        if new_master is None:
+            if self.id == sorted_votes[0]:
+                new_master = self
+            else:
+                logging.error("Could not determine new master.")
+                return None
+        logging.info("new master is {}".format(new_master))
+        self.update_master(new_master)
+        return new_master
+
     def update_master(self, peer):
         """
         Finds the peer object that corresponds to the given peer object and set it as master.
@@ -171,12 +470,13 @@ class Host(Peer):
         Args:
             peer: new master
         """
-        if self.id == peer.id:
+        if self.key == peer.key:
             self.master = self
         else:
-            for p in self.peers:
-                if p.id == peer.id:
-                    self.master = peer
+            known_peer = self.peers.get(peer.key)
+            if known_peer is not None:
+                self.master = known_peer
+        self.__elected.set()
         self.__execute_script()
 
     def __execute_script(self):
@@ -185,7 +485,7 @@ class Host(Peer):
 
         The script will be executed asynchronously.
         """
-        if self.master.id == self.id:
+        if self.master.key == self.key:
             logging.info("Executing master script:")
             subprocess.Popen("./"+self.masterscript)
         else:
@@ -202,25 +502,10 @@ class Host(Peer):
         Args:
             votes_dict: current vote count
         """
-        self.master = None
-        with self.lock:
-            for peer in self.peers:
-                if peer.id == votes_dict["old_master"]:
-                    self.peers.remove(peer)
-                if peer.id == votes_dict["starter"]:
-                    starter = peer
-            all_peers = self.peers.copy()
-        all_peers.append(Peer(self.host, self.port))
-        all_peers = sorted(all_peers, reverse=True, key=lambda p: p.id)
-        next_peer = all_peers[0]
-        for i in range(1, len(all_peers)):
-            if all_peers[i].id < self.id:
-                next_peer = all_peers[i]
-                break
-        votes_dict[all_peers[0].id] = votes_dict[all_peers[0].id] + 1
+        next_peer, starter = self._next_vote_hop(votes_dict)
         logging.info("sending vote to {}".format(next_peer))
         try:
-            r = requests.post("http://"+next_peer.host+":"+str(next_peer.port)+"/vote", json=votes_dict)
+            r = self.connections.post(next_peer, "/vote", votes_dict)
             if r.status_code != 200:
                 raise VotingError
             voted = True
@@ -229,26 +514,63 @@ class Host(Peer):
             voted = False
         if not voted and starter is not None:
             try:
-                r = requests.post("http://"+starter.host+":"+str(starter.port)+"/vote", json=votes_dict)
+                r = self.connections.post(starter, "/vote", votes_dict)
                 if r.status_code != 200:
                     raise VotingError
             except (VotingError, requests.exceptions.ConnectionError):
                 logging.error("Vote starter {} did not accept voting message back. "
                               "Everything is over, nothing works anymore.".format(starter))
 
+    def _next_vote_hop(self, votes_dict):
+        """
+        Remove the old master from the list of peers, add this host's vote and find the next peer in the ring.
+
+        The vote is given to the node with the highest ID, the next peer is the one with the next lower ID.
+
+        Args:
+            votes_dict: current vote count, will be updated
+
+        Returns:
+            (next peer, starter peer) tuple, starter is None if this host is the starter.
+        """
+        self.master = None
+        with self.lock:
+            old_master = self.peers.discard(votes_dict["old_master"])
+            if old_master is not None:
+                self.connections.reset(old_master)
+            starter = self.peers.get(votes_dict["starter"])
+            highest = self.peers.highest()
+            next_peer = self.peers.predecessor(self.key)
+        if highest is None or highest.key < self.key:
+            highest = self
+        if next_peer is None:
+            next_peer = highest
+        votes_dict[highest.id] = votes_dict.get(highest.id, 0) + 1
+        return next_peer, starter
+
     def __search_peers(self):
         """
         Autodetect active peers from the searchlist of possible peers.
         """
-        self.peers = []
+        self.peers = Membership()
         for peer in self.search_list:
             try:
-                r = requests.get("http://"+peer.host+":"+str(peer.port)+"/")
+                r = self.connections.get(peer, "/")
             except requests.exceptions.ConnectionError:
                 continue
-            if r.status_code == 200 and r.text == "Netzwerkprogrammierung2020":
-                self.peers.append(peer)
-                logging.info("Found peer: {}".format(peer))
+            self._found_peer(peer, r)
+
+    def _found_peer(self, peer, response):
+        """
+        Add a peer of the searchlist if it answered like a peer service.
+
+        Args:
+            peer: peer from the searchlist
+            response: answer of the peer to a request of /
+        """
+        if response.status_code == 200 and response.text == "Netzwerkprogrammierung2020":
+            self.peers.append(peer)
+            logging.info("Found peer: {}".format(peer))
 
     def __join_cluster(self):
         """
@@ -259,14 +581,26 @@ class Host(Peer):
         """
         for peer in self.peers:
             try:
-                r = requests.post("http://"+peer.host+":"+str(peer.port)+"/new_node", json=self.to_dict())
+                r = self.connections.post(peer, "/new_node", self.to_dict())
             except requests.exceptions.ConnectionError:
                 raise JoiningClusterError
-            if r.status_code == 200:
-                if r.text == "master":
-                    logging.info("Found current master: {}".format(peer))
-                    self.master = peer
-            else:
-                raise JoiningClusterError
+            self._joined_peer(peer, r)
         if self.master is None:
             raise JoiningClusterError
+
+    def _joined_peer(self, peer, response):
+        """
+        Evaluate the answer of a peer to the request to join the cluster.
+
+        Args:
+            peer: peer the request was sent to
+            response: answer of the peer
+
+        Raises:
+            JoiningClusterError: The peer did not accept the new node.
+        """
+        if response.status_code != 200:
+            raise JoiningClusterError
+        if response.text == "master":
+            logging.info("Found current master: {}".format(peer))
+            self.master = peer
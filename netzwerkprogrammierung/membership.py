@@ -0,0 +1,167 @@
+"""
+In this module the Membership class is defined.
+"""
+
+import bisect
+import threading
+from netzwerkprogrammierung.peer import parse_id
+
+
+class Membership:
+    """
+    Registry of the peers in the cluster, indexed by peer ID.
+
+    Peers are kept in a dict by their int ID and the IDs additionally in a sorted list, which forms the voting ring.
+    IDs may be passed in int or hex form.
+    Lookups by ID are O(1), the successor in the ring and the highest ID are found in O(log n).
+    Iteration follows the order in which the peers were added.
+
+    Attributes:
+        lock: threading.RLock, Lock protecting the registry.
+    """
+
+    def __init__(self, peers=()):
+        """
+        Init the registry.
+
+        Args:
+            peers: peers initially in the registry
+        """
+        self.lock = threading.RLock()
+        self.__peers = {}
+        self.__ring = []
+        for peer in peers:
+            self.add(peer)
+
+    def add(self, peer):
+        """
+        Add a peer, if there is no peer with the same ID yet.
+
+        Args:
+            peer: peer to add
+
+        Returns:
+            True if the peer was added, False if it is a duplicate.
+        """
+        with self.lock:
+            if peer.key in self.__peers:
+                return False
+            self.__peers[peer.key] = peer
+            bisect.insort(self.__ring, peer.key)
+        return True
+
+    def append(self, peer):
+        """
+        Add a peer like add, for code treating the peers as list.
+
+        Args:
+            peer: peer to add
+        """
+        self.add(peer)
+
+    def remove(self, peer):
+        """
+        Remove a peer.
+
+        Args:
+            peer: peer to remove
+
+        Raises:
+            ValueError: The peer is not in the registry.
+        """
+        if self.discard(peer.key) is None:
+            raise ValueError("{} is not a member.".format(peer))
+
+    def discard(self, peer_id):
+        """
+        Remove the peer with the given ID, if there is one.
+
+        Args:
+            peer_id: ID of the peer
+
+        Returns:
+            The removed peer, None if there was no peer with the ID.
+        """
+        key = parse_id(peer_id)
+        with self.lock:
+            peer = self.__peers.pop(key, None)
+            if peer is not None:
+                del self.__ring[bisect.bisect_left(self.__ring, key)]
+            return peer
+
+    def get(self, peer_id):
+        """
+        Get the peer with the given ID.
+
+        Args:
+            peer_id: ID of the peer
+
+        Returns:
+            The peer, None if there is no peer with the ID.
+        """
+        return self.__peers.get(parse_id(peer_id))
+
+    def highest(self):
+        """
+        Get the peer with the highest ID.
+
+        Returns:
+            The peer with the highest ID, None if there are no peers.
+        """
+        with self.lock:
+            if not self.__ring:
+                return None
+            return self.__peers[self.__ring[-1]]
+
+    def predecessor(self, peer_id):
+        """
+        Get the peer with the next lower ID, which is the next hop in the voting ring.
+
+        The given ID does not need to belong to a member.
+
+        Args:
+            peer_id: ID to start from
+
+        Returns:
+            The peer with the highest ID lower than peer_id, None if there is none.
+        """
+        key = parse_id(peer_id)
+        with self.lock:
+            index = bisect.bisect_left(self.__ring, key)
+            if index == 0:
+                return None
+            return self.__peers[self.__ring[index - 1]]
+
+    def copy(self):
+        """
+        Get the peers as list.
+
+        Returns:
+            list of the peers in the order they were added
+        """
+        with self.lock:
+            return list(self.__peers.values())
+
+    def __contains__(self, peer):
+        """
+        Check whether a peer with the ID of the given peer is a member.
+        """
+        return peer.key in self.__peers
+
+    def __iter__(self):
+        """
+        Iterate over a copy of the peers, so the registry may be changed meanwhile.
+        """
+        return iter(self.copy())
+
+    def __len__(self):
+        """
+        Number of peers.
+        """
+        return len(self.__peers)
+
+    def __getitem__(self, index):
+        """
+        Get the peer at a position in the order they were added. O(n), meant for inspection only.
+        """
+        return self.copy()[index]
@@ -2,20 +2,57 @@
 In this module the Peer class is defined.
 """
 
+import functools
 import hashlib
 
 
+@functools.lru_cache(maxsize=65536)
+def _identify(hostport):
+    """
+    Generate the ID of a peer, cached so every peer address is hashed only once.
+
+    Args:
+        hostport: str in the form {host}:{port}
+
+    Returns:
+        (int ID, hex ID) tuple, the hex string is shared by all peers with this address.
+    """
+    digest = hashlib.sha256(hostport.encode("utf8")).digest()
+    return int.from_bytes(digest, "big"), digest.hex()
+
+
+def parse_id(peer_id):
+    """
+    Convert a peer ID in hex form, as used in request payloads, to its int form.
+
+    Args:
+        peer_id: hex str or int ID
+
+    Returns:
+        int ID
+    """
+    if isinstance(peer_id, int):
+        return peer_id
+    return int(peer_id, 16)
+
+
 class Peer:
     """
     Peer class representing a peer host in a high availability cluster running the same service.
 
+    Peers are compared, sorted and hashed by their int ID. Comparing the int IDs orders the peers
+    the same way as comparing the hex IDs.
+
     Attributes:
-        id: str, ID to identify peer
+        key: int, ID to identify peer, SHA-256 of {host}:{port}
+        id: str, ID in hex form as sent to other services
         host: str, Host the service is started on
         port: int, The port the service is accepting connections
         active: bool, True if the last heartbeat request was succesfully answered, False if not.
     """
 
+    __slots__ = ("key", "id", "host", "port", "active")
+
     def __init__(self, host, port):
         """
         Inits the Peer, generating an unique id.
@@ -24,12 +61,31 @@ class Peer:
             host: hostname or ip of the peer
             port: port of the peer
         """
-        hostport = str(host)+":"+str(port)
-        self.id = hashlib.sha256(hostport.encode("utf8")).hexdigest()
+        self.key, self.id = _identify(str(host)+":"+str(port))
         self.host = host
         self.port = port
         self.active = True
 
+    def __eq__(self, other):
+        """
+        Peers are equal if they have the same ID.
+        """
+        if not isinstance(other, Peer):
+            return NotImplemented
+        return self.key == other.key
+
+    def __lt__(self, other):
+        """
+        Order peers by ID.
+        """
+        return self.key < other.key
+
+    def __hash__(self):
+        """
+        Hash of the ID.
+        """
+        return hash(self.key)
+
     def __str__(self):
         """
         String Representation of Peer class.
@@ -41,6 +97,18 @@ class Peer:
         """
         return "Peer(ID: {}, Host: {}, Port: {})".format(self.id, self.host, self.port)
 
+    def url(self, path):
+        """
+        Build the URL of a path on the peer service.
+
+        Args:
+            path: path starting with /
+
+        Returns:
+            URL in the form http://{host}:{port}{path}
+        """
+        return "http://"+str(self.host)+":"+str(self.port)+path
+
     def to_dict(self):
         """
         Generate a dict, representing the Peer. Used in the payload of requests.
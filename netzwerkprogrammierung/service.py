@@ -1,11 +1,17 @@
 """
 This module includes a HTTP server and a ServiceRequestHandler.
+
+The endpoints of the service are defined independently of the server implementation in ROUTES,
+requests are answered by dispatch.
 """
 
 import json
 import logging
+import socket
 import threading
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from netzwerkprogrammierung.heartbeat import UDPHeartbeatResponder
 from netzwerkprogrammierung.peer import Peer
 
 
@@ -15,24 +21,49 @@ class Server:
 
     Attributes:
         host : Host, Host the service is started on.
+        udp_responder: UDPHeartbeatResponder, Answers UDP heartbeats, None if they are not enabled.
+        mode: str, "threaded" to handle connections concurrently with keep-alive,
+              "single" to handle one request at a time.
     """
 
-    def __init__(self, host):
+    MODES = ("threaded", "single")
+
+    def __init__(self, host, mode="threaded", max_connections=256, udp_heartbeat=False):
         """
         Init the server.
 
         Args:
             host: Host, host corresponding to the server.
+            mode: "threaded" or "single"
+            max_connections: Maximum number of connections handled concurrently in threaded mode.
+            udp_heartbeat: True to answer UDP heartbeats next to the HTTP service.
+
+        Raises:
+            OSError: The address is already in use.
         """
         self.host = host
-        self.httpserver = HTTPServer((self.host.host, self.host.port), ServiceRequestHandler)
+        self.mode = mode
+        if mode == "threaded":
+            self.httpserver = ThreadedHTTPServer((self.host.host, self.host.port), KeepAliveRequestHandler,
+                                                 max_connections)
+        elif mode == "single":
+            self.httpserver = HTTPServer((self.host.host, self.host.port), ServiceRequestHandler)
+        else:
+            raise ValueError("Unknown server mode {}.".format(mode))
         self.httpserver.host = self.host
+        try:
+            self.udp_responder = UDPHeartbeatResponder(host) if udp_heartbeat else None
+        except OSError:
+            self.httpserver.server_close()
+            raise
 
     def accept_connections(self):
         """
         Starts the HTTP server to accept connections.
         """
         logging.info("HTTP server started")
+        if self.udp_responder is not None:
+            self.udp_responder.start()
         self.httpserver.serve_forever()
 
     def stop_server(self):
@@ -40,106 +71,345 @@ class Server:
         Stops the HTTP server.
         """
         logging.info("HTTP server stopped")
+        if self.udp_responder is not None:
+            self.udp_responder.stop()
         self.httpserver.shutdown()
         self.httpserver.server_close()
 
 
-class ServiceRequestHandler(BaseHTTPRequestHandler):
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """
-    Extends BaseHTTPRequestHandler to serve HTTP Requests.
+    HTTP server handling every connection in its own thread.
+
+    The number of concurrently handled connections is bounded. If all slots are taken, a further
+    connection is answered with 503 and closed right away, so the accepting thread never blocks.
+    Open connections are tracked, so idle keep-alive connections can be closed when the server is stopped.
+
+    Attributes:
+        slots: threading.BoundedSemaphore, Free connection slots.
+        connections: set, Currently open client sockets.
     """
 
-    def do_GET(self):
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, server_address, handler_class, max_connections):
         """
-        Defines how GET requests are handled. Overrides BaseHTTPRequestHandler method.
+        Init the server.
+
+        Args:
+            server_address: (host, port) tuple the server is bound to
+            handler_class: request handler class
+            max_connections: Maximum number of connections handled concurrently.
         """
-        if self.path == "/":
-            self.__set_response()
-            self.wfile.write("Netzwerkprogrammierung2020".encode('utf-8'))
-        elif self.path == "/heartbeat":
-            self.__set_response()
-            self.wfile.write("pong".encode('utf-8'))
-        else:
-            self.send_response(404)
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
-            self.wfile.write("Not Found.".encode('utf-8'))
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        super().__init__(server_address, handler_class)
 
-    def do_POST(self):
+    def process_request(self, request, client_address):
         """
-        Defines how POST requests are handled. Overrides BaseHTTPRequestHandler method.
+        Start a thread for the connection if there is a free slot. Overrides ThreadingMixIn method.
         """
-        if self.path == "/new_node":
-            # Add new node to cluster
-            if self.server.host.master is None:
-                logging.info("Did not allow new peer to join during voting process.")
-                self.__respond_service_unavailable("Service temporarily unavailable.")
-                return  # Do not accept new peers to the cluster while there is no new master yet.
-            peer_json = self.__receive_post_payload()
-            peer = Peer(peer_json['host'], int(peer_json['port']))
-            if not self.server.host.add_peer(peer):
-                logging.info("Did not allow duplicate peer to join.")
-                self.__respond_service_unavailable("Duplicate ID detected.")
-                return  # Do not accept duplicate peers to the cluster
-            self.__set_response()
-            if self.server.host.master == self.server.host:
-                answer = "master"
-            else:
-                answer = "not master"
-            self.wfile.write(answer.encode('utf-8'))
-            logging.info("Added peer {} to the cluster.".format(peer))
-        elif self.path == "/vote":
-            # vote for new master
-            votes_dict = self.__receive_post_payload()
-            vote_thread = threading.Thread(target=self.server.host.vote, args=(votes_dict,))
-            vote_thread.start()
-            self.__set_response()
-            self.wfile.write("".encode('utf-8'))
-        elif self.path == "/new_master":
-            # get new master from vote starter
-            peer_json = self.__receive_post_payload()
-            peer = Peer(peer_json['host'], int(peer_json['port']))
-            self.server.host.update_master(peer)
-            self.__set_response()
-            self.wfile.write("".encode('utf-8'))
-            logging.info("New master {}.".format(peer))
-        else:
-            # undefined operation
-            self.send_response(404)
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
-            self.wfile.write("Not Found.".encode('utf-8'))
+        if not self.slots.acquire(blocking=False):
+            self.__reject(request)
+            return
+        with self.connections_lock:
+            self.connections.add(request)
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.__release(request)
+            raise
+
+    def process_request_thread(self, request, client_address):
+        """
+        Handle the connection and free its slot afterwards. Overrides ThreadingMixIn method.
+        """
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.__release(request)
+
+    def server_close(self):
+        """
+        Close the listening socket and all open connections. Overrides HTTPServer method.
+        """
+        super().server_close()
+        with self.connections_lock:
+            connections = list(self.connections)
+        for request in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __reject(self, request):
+        """
+        Answer a connection exceeding max_connections with 503 and close it.
+
+        Args:
+            request: client socket of the connection
+        """
+        try:
+            request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nContent-type: text/plain\r\n"
+                            b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def __release(self, request):
+        """
+        Forget a closed connection and free its slot.
+
+        Args:
+            request: client socket of the connection
+        """
+        with self.connections_lock:
+            self.connections.discard(request)
+        self.slots.release()
+
+
+class Request:
+    """
+    HTTP request made to the service, independent of the server implementation.
 
-    def __receive_post_payload(self):
+    Attributes:
+        method: str, HTTP method
+        path: str, requested path
+        headers: mapping of the request headers
+        body: bytes, content of the request
+        spawn: callable, spawn(function, *args) runs function in the background, e.g. in a new thread
+    """
+
+    def __init__(self, method, path, headers, body, spawn):
+        """
+        Init the request.
+
+        Args:
+            method: HTTP method
+            path: requested path
+            headers: mapping of the request headers
+            body: content of the request
+            spawn: callable running a function with arguments in the background
+        """
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self.spawn = spawn
+
+    def payload(self):
         """
         Decode json content as dict.
 
         Returns:
-            dict corresponding to the json object/
+            dict corresponding to the json object
         """
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length).decode('utf-8')
-        return json.loads(post_data)
+        return json.loads(self.body.decode('utf-8'))
 
-    def __set_response(self):
+
+class Response:
+    """
+    HTTP response of the service.
+
+    Attributes:
+        status: int, HTTP status code
+        body: bytes, content of the response
+        content_type: str, Content-type of the response
+    """
+
+    def __init__(self, message="", status=200, content_type="text/plain"):
         """
-        Set standard response.
+        Init the response.
+
+        Args:
+            message: str or bytes, content of the response
+            status: HTTP status code, Default: 200
+            content_type: Content-type of the response, Default: text/plain
         """
-        self.send_response(200)
-        self.send_header("Content-type", "text/plain")
-        self.end_headers()
+        self.status = status
+        self.body = message.encode('utf-8') if isinstance(message, str) else message
+        self.content_type = content_type
+
+
+def dispatch(host, request):
+    """
+    Handle a request made to the service.
+
+    Args:
+        host: Host the service is started on.
+        request: Request to handle
+
+    Returns:
+        Response to the request
+    """
+    handler = ROUTES.get(request.method, {}).get(request.path)
+    if handler is None:
+        # undefined operation
+        return Response("Not Found.", 404)
+    return handler(host, request)
+
+
+def _get_root(host, request):
+    """
+    Identify the service.
+    """
+    return Response("Netzwerkprogrammierung2020")
+
 
-    def __respond_service_unavailable(self, message):
+def _get_heartbeat(host, request):
+    """
+    Answer a heartbeat request.
+    """
+    return Response("pong")
+
+
+def _get_detector(host, request):
+    """
+    Report the suspicion level of every peer as json.
+    """
+    return Response(json.dumps(host.suspicion_levels()), content_type="application/json")
+
+
+def _get_announcement(host, request):
+    """
+    Report which peers acknowledged the last new master announced by this host as json.
+    """
+    return Response(json.dumps(host.announcement), content_type="application/json")
+
+
+def _post_new_node(host, request):
+    """
+    Add new node to cluster.
+    """
+    peer_json = request.payload()
+    if host.master is None:
+        logging.info("Did not allow new peer to join during voting process.")
+        # Do not accept new peers to the cluster while there is no new master yet.
+        return Response("Service temporarily unavailable.", 503)
+    peer = Peer(peer_json['host'], int(peer_json['port']))
+    if not host.add_peer(peer):
+        logging.info("Did not allow duplicate peer to join.")
+        # Do not accept duplicate peers to the cluster
+        return Response("Duplicate ID detected.", 503)
+    logging.info("Added peer {} to the cluster.".format(peer))
+    if host.master == host:
+        return Response("master")
+    return Response("not master")
+
+
+def _post_vote(host, request):
+    """
+    Vote for new master in the background.
+    """
+    request.spawn(host.vote, request.payload())
+    return Response()
+
+
+def _post_election(host, request):
+    """
+    Take over a bully election started by a peer with a lower ID in the background.
+    """
+    if host.election != "bully":
+        return Response("Not Found.", 404)
+    request.spawn(host.start_vote)
+    return Response("ok")
+
+
+def _post_new_master(host, request):
+    """
+    Get new master from vote starter.
+    """
+    peer_json = request.payload()
+    peer = Peer(peer_json['host'], int(peer_json['port']))
+    host.update_master(peer)
+    logging.info("New master {}.".format(peer))
+    return Response()
+
+
+def _post_ping(host, request):
+    """
+    Answer a SWIM ping with piggybacked membership updates.
+    """
+    if host.swim is None:
+        return Response("Not Found.", 404)
+    return Response(json.dumps(host.swim.handle_ping(request.payload())), content_type="application/json")
+
+
+def _post_ping_req(host, request):
+    """
+    Probe a peer on behalf of another peer for SWIM.
+    """
+    if host.swim is None:
+        return Response("Not Found.", 404)
+    return Response(json.dumps(host.swim.handle_ping_req(request.payload())), content_type="application/json")
+
+
+ROUTES = {
+    "GET": {
+        "/": _get_root,
+        "/heartbeat": _get_heartbeat,
+        "/detector": _get_detector,
+        "/announcement": _get_announcement,
+    },
+    "POST": {
+        "/new_node": _post_new_node,
+        "/vote": _post_vote,
+        "/election": _post_election,
+        "/new_master": _post_new_master,
+        "/ping": _post_ping,
+        "/ping_req": _post_ping_req,
+    },
+}
+
+
+def spawn_thread(function, *args):
+    """
+    Run a function in a new thread.
+
+    Args:
+        function: function to run
+        args: arguments of the function
+    """
+    threading.Thread(target=function, args=args).start()
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    Extends BaseHTTPRequestHandler to serve HTTP Requests.
+    """
+
+    def do_GET(self):
         """
-        Set response if the service is unavailable.
+        Defines how GET requests are handled. Overrides BaseHTTPRequestHandler method.
+        """
+        self.__handle("GET")
+
+    def do_POST(self):
+        """
+        Defines how POST requests are handled. Overrides BaseHTTPRequestHandler method.
+        """
+        self.__handle("POST")
+
+    def __handle(self, method):
+        """
+        Read the request, dispatch it and send the response.
+
+        The Content-Length header is always set, so the connection can be kept alive.
 
         Args:
-            message: Message to be sent.
+            method: HTTP method of the request
         """
-        self.send_response(503)
-        self.send_header("Content-type", "text/plain")
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+        request = Request(method, self.path, self.headers, body, spawn_thread)
+        response = dispatch(self.server.host, request)
+        self.send_response(response.status)
+        self.send_header("Content-type", response.content_type)
+        self.send_header("Content-Length", str(len(response.body)))
         self.end_headers()
-        self.wfile.write(message.encode('utf-8'))
+        self.wfile.write(response.body)
 
     def log_request(self, code='-', size='-'):
         """
@@ -149,3 +419,15 @@ class ServiceRequestHandler(BaseHTTPRequestHandler):
         normal incoming HTTP request to stdout.
         """
         pass
+
+
+class KeepAliveRequestHandler(ServiceRequestHandler):
+    """
+    ServiceRequestHandler speaking HTTP/1.1, keeping connections open for further requests.
+
+    Idle connections are closed after timeout seconds. With heartbeats every second, the connection
+    of a live peer stays open while connections that are only used occasionally free their slot soon.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = 3
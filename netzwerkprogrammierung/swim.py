@@ -0,0 +1,357 @@
+"""
+In this module the SwimDetector class is defined.
+
+SWIM-style failure detection replaces the all-to-all heartbeats: every round a host probes a single
+peer, asks k other peers to probe it indirectly if it does not answer, and only suspects it then.
+Suspicions, deaths and joins are piggybacked on the probe traffic, so the load per host stays
+constant and the time to detect a failure only grows logarithmically with the cluster size.
+"""
+
+import logging
+import math
+import random
+import threading
+import requests
+from netzwerkprogrammierung.peer import Peer
+
+ALIVE = "alive"
+SUSPECT = "suspect"
+DEAD = "dead"
+
+
+class SwimDetector:
+    """
+    SWIM failure detector and membership dissemination of a Host.
+
+    Attributes:
+        host: Host the detector belongs to.
+        indirect_probes: int, Number of peers asked to probe a target that did not answer.
+        suspicion_mult: int, Suspicion lasts suspicion_mult * log10(n + 1) rounds, at least two.
+        max_piggyback: int, Maximum number of updates piggybacked on a message.
+        incarnation: int, Incarnation of the host, increased to refute suspicions.
+        rounds: int, Number of probe rounds so far.
+        lock: threading.Lock, Lock protecting the state of the detector.
+    """
+
+    def __init__(self, host, indirect_probes=3, suspicion_mult=4, max_piggyback=8):
+        """
+        Init the detector.
+
+        Args:
+            host: Host the detector belongs to.
+            indirect_probes: Number of peers asked to probe a target that did not answer.
+            suspicion_mult: Multiplier of the suspicion timeout.
+            max_piggyback: Maximum number of updates piggybacked on a message.
+        """
+        self.host = host
+        self.indirect_probes = indirect_probes
+        self.suspicion_mult = suspicion_mult
+        self.max_piggyback = max_piggyback
+        self.incarnation = 0
+        self.rounds = 0
+        self.lock = threading.Lock()
+        self.__incarnations = {}
+        self.__suspects = {}
+        self.__updates = {}
+        self.__targets = []
+
+    def round(self):
+        """
+        Run one probe round.
+
+        Probes the next peer directly, then indirectly through other peers,
+        and suspects it if nobody reached it. Suspects whose suspicion timed out are declared dead.
+        """
+        with self.lock:
+            self.rounds += 1
+        target = self.__next_target()
+        if target is not None:
+            if self.probe(target) or self.__probe_indirectly(target):
+                self.__alive(target)
+            else:
+                self.__suspect(target, self.__incarnations.get(target.key, 0))
+        self.__expire_suspicions()
+
+    def probe(self, target):
+        """
+        Send a ping with piggybacked updates to a peer.
+
+        Args:
+            target: peer to ping
+
+        Returns:
+            True if the peer acknowledged the ping, False if not.
+        """
+        try:
+            r = self.host.connections.post(target, "/ping", self.message(), timeout=self.host.heartbeat_timeout)
+        except requests.exceptions.RequestException:
+            return False
+        if r.status_code != 200:
+            return False
+        self.apply(r.json().get("updates", []))
+        return True
+
+    def message(self, **fields):
+        """
+        Build a message of this host with piggybacked updates.
+
+        Args:
+            fields: further fields of the message
+
+        Returns:
+            dict with the sender, the updates and the given fields
+        """
+        message = {"from": self.host.to_dict(), "updates": self.piggyback()}
+        message.update(fields)
+        return message
+
+    def handle_ping(self, message):
+        """
+        Answer a ping of another peer.
+
+        Args:
+            message: received message with sender and updates
+
+        Returns:
+            dict answer with piggybacked updates
+        """
+        self.__heard_from(message)
+        self.apply(message.get("updates", []))
+        return {"updates": self.piggyback()}
+
+    def handle_ping_req(self, message):
+        """
+        Probe a peer on behalf of another peer.
+
+        Args:
+            message: received message with sender, updates and target
+
+        Returns:
+            dict answer with ack True if the target answered and piggybacked updates
+        """
+        self.__heard_from(message)
+        self.apply(message.get("updates", []))
+        target = message["target"]
+        ack = self.probe(Peer(target["host"], int(target["port"])))
+        return {"ack": ack, "updates": self.piggyback()}
+
+    def joined(self, peer):
+        """
+        Disseminate that a peer joined the cluster.
+
+        A peer that rejoins after a restart starts again with incarnation 0.
+
+        Args:
+            peer: new peer
+        """
+        with self.lock:
+            self.__incarnations[peer.key] = 0
+            self.__suspects.pop(peer.key, None)
+            self.__enqueue(peer, ALIVE, 0)
+
+    def piggyback(self):
+        """
+        Select the updates sent least often so far to piggyback them on a message.
+
+        Every update is sent about 3 * log10(n + 1) times before it is dropped.
+
+        Returns:
+            list of update dicts
+        """
+        with self.lock:
+            limit = 3 * math.ceil(math.log10(len(self.host.peers) + 2))
+            selected = sorted(self.__updates.items(), key=lambda item: item[1][1])[:self.max_piggyback]
+            updates = []
+            for key, (update, transmissions) in selected:
+                if transmissions + 1 >= limit:
+                    del self.__updates[key]
+                else:
+                    self.__updates[key] = (update, transmissions + 1)
+                updates.append(update)
+            return updates
+
+    def apply(self, updates):
+        """
+        Apply updates received from another peer.
+
+        Updates about this host with a suspicion or death are refuted with a higher incarnation.
+        Updates about other peers are applied if they are not older than the known state.
+
+        Args:
+            updates: list of update dicts with id, host, port, state and incarnation
+        """
+        for update in updates:
+            peer = Peer(update["host"], int(update["port"]))
+            state = update["state"]
+            incarnation = update["incarnation"]
+            if peer.key == self.host.key:
+                if state != ALIVE:
+                    with self.lock:
+                        self.incarnation = max(self.incarnation, incarnation) + 1
+                        self.__enqueue(self.host, ALIVE, self.incarnation)
+                continue
+            known = self.host.peers.get(peer.key)
+            if state == ALIVE:
+                with self.lock:
+                    if incarnation <= self.__incarnations.get(peer.key, -1):
+                        continue
+                    self.__incarnations[peer.key] = incarnation
+                    self.__suspects.pop(peer.key, None)
+                    self.__enqueue(peer, ALIVE, incarnation)
+                if known is None and self.host.peers.add(peer):
+                    logging.info("{} joined the cluster.".format(peer))
+            elif known is None:
+                continue
+            elif state == SUSPECT:
+                self.__suspect(known, incarnation)
+            elif state == DEAD:
+                self.__dead(known, incarnation)
+
+    def suspects(self):
+        """
+        Get the currently suspected peers.
+
+        Returns:
+            list of suspected peer ids
+        """
+        with self.lock:
+            return [self.host.peers.get(key).id for key in self.__suspects if self.host.peers.get(key) is not None]
+
+    def suspicion_rounds(self):
+        """
+        Number of rounds a suspected peer has to refute the suspicion before it is declared dead.
+        """
+        return max(2, math.ceil(self.suspicion_mult * math.log10(len(self.host.peers) + 1)))
+
+    def __next_target(self):
+        """
+        Get the next probe target, going through the peers in a random order each cycle.
+
+        Returns:
+            Peer, None if there are no peers.
+        """
+        with self.lock:
+            while self.__targets:
+                target = self.host.peers.get(self.__targets.pop())
+                if target is not None:
+                    return target
+            self.__targets = [peer.key for peer in self.host.peers]
+            random.shuffle(self.__targets)
+            if not self.__targets:
+                return None
+            return self.host.peers.get(self.__targets.pop())
+
+    def __probe_indirectly(self, target):
+        """
+        Ask up to indirect_probes other peers concurrently to probe the target.
+
+        Args:
+            target: peer that did not answer a ping
+
+        Returns:
+            True if any of the peers reached the target, False if not.
+        """
+        helpers = [peer for peer in self.host.peers if peer.key != target.key]
+        helpers = random.sample(helpers, min(self.indirect_probes, len(helpers)))
+        return any(self.host.executor.map(lambda helper: self.__request_probe(helper, target), helpers))
+
+    def __request_probe(self, helper, target):
+        """
+        Ask a peer to probe the target.
+
+        Returns:
+            True if the peer reached the target, False if not.
+        """
+        try:
+            r = self.host.connections.post(helper, "/ping_req", self.message(target=target.to_dict()),
+                                           timeout=2 * self.host.heartbeat_timeout)
+        except requests.exceptions.RequestException:
+            return False
+        if r.status_code != 200:
+            return False
+        answer = r.json()
+        self.apply(answer.get("updates", []))
+        return answer.get("ack", False)
+
+    def __heard_from(self, message):
+        """
+        A message from a peer proves it is alive, clear a suspicion of it.
+
+        Args:
+            message: received message with sender
+        """
+        sender = message.get("from")
+        if sender is not None:
+            self.__alive(Peer(sender["host"], int(sender["port"])))
+
+    def __alive(self, peer):
+        """
+        Clear the suspicion of a peer that answered.
+
+        Args:
+            peer: peer that answered
+        """
+        with self.lock:
+            self.__suspects.pop(peer.key, None)
+        known = self.host.peers.get(peer.key)
+        if known is not None:
+            known.active = True
+
+    def __suspect(self, peer, incarnation):
+        """
+        Suspect a peer and disseminate the suspicion, unless it refuted it with a higher incarnation.
+
+        Args:
+            peer: suspected peer
+            incarnation: incarnation the suspicion refers to
+        """
+        with self.lock:
+            if incarnation < self.__incarnations.get(peer.key, 0) or peer.key in self.__suspects:
+                return
+            self.__incarnations[peer.key] = incarnation
+            self.__suspects[peer.key] = self.rounds
+            self.__enqueue(peer, SUSPECT, incarnation)
+        peer.active = False
+        logging.info("{} is suspected.".format(peer))
+
+    def __dead(self, peer, incarnation):
+        """
+        Declare a peer dead, disseminate it and remove it from the cluster.
+
+        Args:
+            peer: dead peer
+            incarnation: incarnation the death refers to
+        """
+        with self.lock:
+            if incarnation < self.__incarnations.get(peer.key, 0):
+                return
+            self.__suspects.pop(peer.key, None)
+            # the incarnation is kept, so older alive updates do not bring the peer back
+            self.__incarnations[peer.key] = incarnation
+            self.__enqueue(peer, DEAD, incarnation)
+        logging.warning("{} is determined dead.".format(peer))
+        if self.host._peer_died(peer):
+            self.host.start_vote()
+
+    def __expire_suspicions(self):
+        """
+        Declare the peers dead whose suspicion lasted suspicion_rounds rounds.
+        """
+        timeout = self.suspicion_rounds()
+        with self.lock:
+            expired = [key for key, since in self.__suspects.items() if self.rounds - since >= timeout]
+        for key in expired:
+            peer = self.host.peers.get(key)
+            if peer is None:
+                with self.lock:
+                    self.__suspects.pop(key, None)
+                continue
+            self.__dead(peer, self.__incarnations.get(key, 0))
+
+    def __enqueue(self, peer, state, incarnation):
+        """
+        Queue an update for dissemination, replacing older updates about the same peer.
+        Has to be called with the lock held.
+        """
+        update = {"id": peer.id, "host": peer.host, "port": peer.port, "state": state, "incarnation": incarnation}
+        self.__updates[peer.key] = (update, 0)
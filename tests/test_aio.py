@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import unittest
+import requests
+from netzwerkprogrammierung.aio import AsyncHost, AsyncServer
+from netzwerkprogrammierung.host import Host
+from netzwerkprogrammierung.service import Server
+
+
+class MockAsyncHost(AsyncHost):
+    # Override __execute_script method of Host to not execute scripts during tests
+    def _Host__execute_script(self):
+        pass
+
+
+class MockHost(Host):
+    # Override __execute_script method of Host to not execute scripts during tests
+    def _Host__execute_script(self):
+        pass
+
+
+class AsyncRuntimeTest(unittest.TestCase):
+
+    def test_get_heartbeat(self):
+        async def scenario():
+            host = MockAsyncHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh")
+            server = AsyncServer(host)
+            await server.start()
+            loop = asyncio.get_running_loop()
+            session = requests.Session()
+            url = "http://" + host.host + ":" + str(host.port) + "/heartbeat"
+            r1 = await loop.run_in_executor(None, session.get, url)
+            r2 = await loop.run_in_executor(None, session.get, url)
+            session.close()
+            await server.stop()
+            return r1, r2
+        r1, r2 = asyncio.run(scenario())
+        self.assertEqual(r1.status_code, 200, "Status code should be 200")
+        self.assertEqual(r2.text, "pong", "Heartbeat answer should be pong")
+
+    def test_heartbeat_threaded_server(self):
+        host = MockHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh")
+        host.start()
+        server = Server(host)
+        server_thread = threading.Thread(target=server.accept_connections)
+        server_thread.start()
+        self.addCleanup(server_thread.join)
+        self.addCleanup(server.stop_server)
+
+        async def scenario():
+            async_host = MockAsyncHost("localhost", 7001, [host], "masterscript.sh", "slavescript.sh")
+            try:
+                await async_host.start()
+                await async_host.request_heartbeats()
+                await async_host.request_heartbeats()
+                return async_host, async_host.connections.stats()
+            finally:
+                async_host.connections.close()
+        async_host, stats = asyncio.run(scenario())
+        self.assertEqual(async_host.master.id, host.id, "master should be the threaded host")
+        self.assertEqual(len(host.peers), 1, "Async host should have joined")
+        self.assertTrue(async_host.peers[0].active, "Peer should be active")
+        self.assertEqual(stats["connections_created"], 1, "All requests should reuse one connection")
+
+    def test_voting(self):
+        async def scenario():
+            host1 = MockAsyncHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh")
+            server1 = AsyncServer(host1)
+            await server1.start()
+            await host1.start()
+            host2 = MockAsyncHost("localhost", 7001, [host1], "masterscript.sh", "slavescript.sh")
+            server2 = AsyncServer(host2)
+            await server2.start()
+            await host2.start()
+            host3 = MockAsyncHost("localhost", 7002, [host1, host2], "masterscript.sh", "slavescript.sh")
+            server3 = AsyncServer(host3)
+            await server3.start()
+            await host3.start()
+            masters = [host2.master.id, host3.master.id]
+
+            await server1.stop()
+            for i in range(2):
+                await asyncio.gather(host2.request_heartbeats(), host3.request_heartbeats())
+            for i in range(20):
+                if host2.master is not None and host3.master is not None:
+                    break
+                await asyncio.sleep(0.1)
+            await server2.stop()
+            await server3.stop()
+            return host1, host2, host3, masters
+        host1, host2, host3, masters = asyncio.run(scenario())
+        self.assertEqual(masters, [host1.id, host1.id], "master should be host1")
+        self.assertEqual(host2.master.id, host2.id, "master should be host2")
+        self.assertEqual(host3.master.id, host2.id, "master should be host2")
@@ -0,0 +1,34 @@
+import unittest
+from netzwerkprogrammierung.detector import ALIVE, DEAD, SUSPECT, PhiAccrualDetector, TwoMissDetector, phi
+from netzwerkprogrammierung.peer import Peer
+
+
+class DetectorTest(unittest.TestCase):
+
+    def test_two_miss(self):
+        detector = TwoMissDetector()
+        peer = Peer("localhost", 7001)
+        self.assertEqual(detector.report(peer, False, 0), SUSPECT, "First miss should be suspected")
+        self.assertEqual(detector.report(peer, True, 1), ALIVE, "Answer should clear the suspicion")
+        self.assertEqual(detector.report(peer, False, 2), SUSPECT, "Miss should be suspected again")
+        self.assertEqual(detector.report(peer, False, 3), DEAD, "Second consecutive miss should be dead")
+
+    def test_phi(self):
+        self.assertAlmostEqual(phi(1.0, 1.0, 0.1), 0.30103, 4, "phi at the mean should be -log10(0.5)")
+        self.assertLess(phi(1.1, 1.0, 0.1), phi(1.2, 1.0, 0.1), "phi should grow with the elapsed time")
+        self.assertGreater(phi(1000.0, 1.0, 0.1), 100, "phi should be finite for far outliers")
+
+    def test_phi_adapts_to_jitter(self):
+        steady = PhiAccrualDetector(threshold=8, min_std=0.01)
+        jittery = PhiAccrualDetector(threshold=8, min_std=0.01)
+        peer = Peer("localhost", 7001)
+        now = 0.0
+        for i in range(20):
+            steady.report(peer, True, i * 1.0)
+            now += 0.5 if i % 2 else 1.5
+            jittery.report(peer, True, now)
+        self.assertEqual(steady.report(peer, False, 19 + 1.5), DEAD, "Steady peer should be dead after 1.5 intervals")
+        self.assertEqual(jittery.report(peer, False, now + 1.5), SUSPECT, "Jittery peer should only be suspected")
+        self.assertEqual(jittery.report(peer, False, now + 5), DEAD, "Jittery peer should be dead eventually")
+        jittery.forget(peer)
+        self.assertEqual(jittery.level(peer, now + 5), 0.0, "Forgotten peer should not be suspected")
@@ -1,3 +1,5 @@
+import socket
+import time
 import unittest
 from netzwerkprogrammierung.host import Host
 from netzwerkprogrammierung.peer import Peer
@@ -51,3 +53,35 @@ class HostTest(unittest.TestCase):
         self.assertEqual(host.master.host, "localhost", "Master host should be localhost")
         self.assertEqual(host.master.port, "7000", "Master port should be 7000")
         self.assertEqual(len(host.peers), 0, "Number of peers should be 0")
+
+    def test_heartbeats_concurrent_with_timeout(self):
+        # Sockets that accept connections but never answer
+        blackholes = []
+        for port in (7001, 7002, 7003):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind(("localhost", port))
+            s.listen(5)
+            blackholes.append(s)
+        host = MockHost("localhost", "7000", [], "masterscript.sh", "slavescript.sh", heartbeat_timeout=0.5)
+        for port in (7001, 7002, 7003):
+            host.add_peer(Peer("localhost", port))
+        start = time.monotonic()
+        host.request_heartbeats()
+        duration = time.monotonic() - start
+        for s in blackholes:
+            s.close()
+        self.assertLess(duration, 1.0, "Heartbeat round should take about one timeout")
+        self.assertEqual(len(host.peers), 3, "Should be 3 peers after first missed heartbeat")
+        self.assertFalse(any(p.active for p in host.peers), "All peers should have missed a heartbeat")
+
+    def test_peer_ids(self):
+        peer1 = Peer("peerhost", "7001")
+        peer2 = Peer("peerhost", 7001)
+        self.assertEqual(peer1, peer2, "Peers with the same address should be equal")
+        self.assertIs(peer1.id, peer2.id, "Hex IDs should be shared")
+        self.assertEqual(int(peer1.id, 16), peer1.key, "Key should be the int form of the ID")
+        self.assertFalse(hasattr(peer1, "__dict__"), "Peer should be slotted")
+        peers = [Peer("peerhost", port) for port in range(7001, 7010)]
+        self.assertEqual([p.id for p in sorted(peers)], sorted(p.id for p in peers),
+                         "Peers should be ordered like their hex IDs")
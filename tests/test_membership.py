@@ -0,0 +1,31 @@
+import unittest
+from netzwerkprogrammierung.membership import Membership
+from netzwerkprogrammierung.peer import Peer
+
+
+class MembershipTest(unittest.TestCase):
+
+    def test_add_duplicate(self):
+        membership = Membership()
+        peer = Peer("localhost", 7001)
+        self.assertTrue(membership.add(peer), "Peer should be added")
+        self.assertFalse(membership.add(Peer("localhost", 7001)), "Duplicate should not be added")
+        self.assertEqual(len(membership), 1, "Should be 1 peer")
+        self.assertIs(membership.get(peer.id), peer, "Peer should be found by ID")
+
+    def test_ring(self):
+        peers = [Peer("localhost", port) for port in range(7001, 7011)]
+        membership = Membership(peers)
+        ids = sorted(p.id for p in peers)
+        self.assertEqual(membership.highest().id, ids[-1], "Highest ID should be found")
+        self.assertEqual(membership.predecessor(ids[5]).id, ids[4], "Next lower ID should be found")
+        self.assertIsNone(membership.predecessor(ids[0]), "Lowest ID should have no predecessor")
+        membership.remove(membership.get(ids[4]))
+        self.assertEqual(membership.predecessor(ids[5]).id, ids[3], "Removed peer should be skipped")
+        self.assertEqual(len(membership), 9, "Should be 9 peers")
+
+    def test_remove_missing(self):
+        membership = Membership()
+        self.assertIsNone(membership.discard("0"), "Nothing should be removed")
+        with self.assertRaises(ValueError):
+            membership.remove(Peer("localhost", 7001))
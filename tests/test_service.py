@@ -1,3 +1,4 @@
+import socket
 import threading
 import time
 import unittest
@@ -211,6 +212,150 @@ class ServerTest(unittest.TestCase):
         server3.stop_server()
         server3_thread.join()
 
+    def test_bully_election(self):
+        hosts, servers, threads = [], [], []
+        for port in (7000, 7001, 7002):
+            host = MockHost("localhost", port, list(hosts), "masterscript.sh", "slavescript.sh", election="bully")
+            server = Server(host)
+            server_thread = threading.Thread(target=server.accept_connections)
+            server_thread.start()
+            host.start()
+            hosts.append(host)
+            servers.append(server)
+            threads.append(server_thread)
+        self.assertEqual(hosts[2].master.id, hosts[0].id, "master should be host1")
+
+        servers[0].stop_server()
+        threads[0].join()
+        lower, higher = sorted(hosts[1:], key=lambda h: h.key)
+        # the lower host starts the election, the higher one takes it over and announces itself
+        lower.start_vote()
+        time.sleep(0.5)
+
+        for server, server_thread in zip(servers[1:], threads[1:]):
+            server.stop_server()
+            server_thread.join()
+        self.assertEqual(higher.master.id, higher.id, "master should be the host with the highest ID")
+        self.assertEqual(lower.master.id, higher.id, "master should be the host with the highest ID")
+        self.assertIsNone(lower.peers.get(hosts[0].key), "old master should be removed")
+
+    def test_announce_master(self):
+        host = MockHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh",
+                        announce_timeout=0.2, announce_retries=1)
+        host.start()
+        server = Server(host)
+        server_thread = threading.Thread(target=server.accept_connections)
+        server_thread.start()
+        hung = socket.socket()
+        hung.bind(("localhost", 7003))
+        hung.listen()
+        live_peer, dead_peer, hung_peer = Peer("localhost", 7000), Peer("localhost", 7001), Peer("localhost", 7003)
+        for peer in (live_peer, dead_peer, hung_peer):
+            host.add_peer(peer)
+        start = time.monotonic()
+        missing = host._announce_master(host)
+        elapsed = time.monotonic() - start
+        r = requests.get("http://" + host.host + ":" + str(host.port) + "/announcement")
+        server.stop_server()
+        server_thread.join()
+        hung.close()
+        self.assertLess(elapsed, 1.5, "Hung peer should not delay the announcement beyond its deadlines")
+        self.assertEqual(sorted(p.id for p in missing), sorted([dead_peer.id, hung_peer.id]),
+                         "Dead and hung peer should not acknowledge")
+        self.assertEqual(r.json()["acked"], [live_peer.id], "Live peer should acknowledge")
+        self.assertEqual(r.json()["master"], host.id, "Announced master should be host")
+
+    def test_connection_pool(self):
+        host = MockHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh")
+        host.start()
+        server = Server(host)
+        server_thread = threading.Thread(target=server.accept_connections)
+        server_thread.start()
+        peer = Peer("localhost", 7000)
+        dead_peer = Peer("localhost", 7001)
+        host.add_peer(peer)
+        host.add_peer(dead_peer)
+        host.request_heartbeats()
+        host.request_heartbeats()
+        stats = host.connections.stats()
+        server.stop_server()
+        server_thread.join()
+        self.assertEqual(stats["requests"], 2, "Two heartbeats should have been answered")
+        self.assertEqual(stats["failures"], 2, "Two heartbeats should have failed")
+        self.assertEqual(stats["open_sessions"], 1, "Only the session of the live peer should be open")
+        self.assertEqual(len(host.peers), 1, "Dead peer should be removed")
+
+    def test_heartbeat_during_slow_request(self):
+        host = MockHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh")
+        host.start()
+        server = Server(host)
+        server_thread = threading.Thread(target=server.accept_connections)
+        server_thread.start()
+        # Request whose body never arrives, blocking its handler
+        slow = socket.create_connection((host.host, host.port))
+        slow.sendall(b"POST /new_node HTTP/1.1\r\nContent-Length: 100\r\n\r\n")
+        r = requests.get("http://" + host.host + ":" + str(host.port) + "/heartbeat", timeout=1)
+        slow.close()
+        server.stop_server()
+        server_thread.join()
+        self.assertEqual(r.text, "pong", "Heartbeat answer should be pong")
+
+    def test_keep_alive(self):
+        host = MockHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh")
+        server = Server(host)
+        server_thread = threading.Thread(target=server.accept_connections)
+        server_thread.start()
+        session = requests.Session()
+        r1 = session.get("http://" + host.host + ":" + str(host.port) + "/heartbeat")
+        r2 = session.get("http://" + host.host + ":" + str(host.port) + "/heartbeat")
+        open_connections = len(server.httpserver.connections)
+        session.close()
+        server.stop_server()
+        server_thread.join()
+        self.assertEqual(r1.text, "pong", "Heartbeat answer should be pong")
+        self.assertEqual(r2.text, "pong", "Heartbeat answer should be pong")
+        self.assertEqual(open_connections, 1, "Both requests should use the same connection")
+
+    def test_max_connections(self):
+        host = MockHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh")
+        server = Server(host, max_connections=1)
+        server_thread = threading.Thread(target=server.accept_connections)
+        server_thread.start()
+        session = requests.Session()
+        r1 = session.get("http://" + host.host + ":" + str(host.port) + "/heartbeat", timeout=1)
+        # The kept-alive connection of the session takes the only slot
+        r2 = requests.get("http://" + host.host + ":" + str(host.port) + "/heartbeat", timeout=1)
+        start = time.monotonic()
+        server.stop_server()
+        server_thread.join()
+        duration = time.monotonic() - start
+        session.close()
+        self.assertEqual(r1.text, "pong", "Heartbeat answer should be pong")
+        self.assertEqual(r2.status_code, 503, "Connection exceeding the limit should be rejected")
+        self.assertLess(duration, 1, "Server should stop right away")
+
+    def test_udp_heartbeat(self):
+        host = MockHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh", heartbeat_transport="udp")
+        host.start()
+        server = Server(host, udp_heartbeat=True)
+        server_thread = threading.Thread(target=server.accept_connections)
+        server_thread.start()
+        peer = Peer("localhost", 7000)
+        dead_peer = Peer("localhost", 7001)
+        host.add_peer(peer)
+        host.add_peer(dead_peer)
+        for i in range(3):
+            host.request_heartbeats()
+        server.stop_server()
+        server_thread.join()
+        host.udp.close()
+        stats = host.udp.stats()
+        self.assertEqual(len(host.peers), 1, "Dead peer should be removed")
+        self.assertEqual(stats[peer.id]["received"], 3, "All pings should be answered")
+        self.assertEqual(stats[peer.id]["lost"], 0, "No ping should be lost")
+        self.assertLess(stats[peer.id]["avg_rtt"], host.heartbeat_timeout, "RTT should be measured")
+        self.assertNotIn(dead_peer.id, stats, "Statistics of dead peer should be removed")
+
     def test_post_404(self):
         host = MockHost("localhost", 7000, [], "masterscript.sh", "slavescript.sh")
         server = Server(host)
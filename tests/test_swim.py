@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+from netzwerkprogrammierung.host import Host
+from netzwerkprogrammierung.service import Server
+
+
+class MockHost(Host):
+    # Override __execute_script method of Host to not execute scripts during tests
+    def _Host__execute_script(self):
+        pass
+
+
+class SwimTest(unittest.TestCase):
+
+    def start_cluster(self, ports):
+        hosts = []
+        servers = []
+        for port in ports:
+            host = MockHost("localhost", port, hosts.copy(), "masterscript.sh", "slavescript.sh",
+                            heartbeat_timeout=0.2, failure_detection="swim")
+            server = Server(host)
+            server_thread = threading.Thread(target=server.accept_connections)
+            server_thread.start()
+            self.addCleanup(server_thread.join)
+            servers.append(server)
+            host.start()
+            hosts.append(host)
+        return hosts, servers
+
+    def test_master_failure(self):
+        hosts, servers = self.start_cluster([7000, 7001, 7002, 7003])
+        servers[0].stop_server()
+        survivors = hosts[1:]
+        for i in range(30):
+            for host in survivors:
+                host.request_heartbeats()
+            if all(len(h.peers) == 2 and h.master is not None and h.master.key != hosts[0].key for h in survivors):
+                break
+        time.sleep(0.5)
+        for server in servers[1:]:
+            server.stop_server()
+        expected = max(survivors, key=lambda h: h.key)
+        for host in survivors:
+            self.assertEqual(len(host.peers), 2, "Dead master should be removed")
+            self.assertEqual(host.master.key, expected.key, "Host with highest ID should be master")
+
+    def test_join_gossip(self):
+        hosts, servers = self.start_cluster([7000, 7001])
+        # The new host only knows the first host, the second one learns about it by gossip
+        late = MockHost("localhost", 7002, [hosts[0]], "masterscript.sh", "slavescript.sh",
+                        heartbeat_timeout=0.2, failure_detection="swim")
+        server = Server(late)
+        server_thread = threading.Thread(target=server.accept_connections)
+        server_thread.start()
+        self.addCleanup(server_thread.join)
+        servers.append(server)
+        late.start()
+        for i in range(10):
+            hosts[0].request_heartbeats()
+            hosts[1].request_heartbeats()
+            if late in hosts[1].peers and hosts[1] in late.peers:
+                break
+        for server in servers:
+            server.stop_server()
+        self.assertIn(late, hosts[1].peers, "New host should be known by gossip")
+        self.assertIn(hosts[1], late.peers, "New host should learn the other host by gossip")